@@ -0,0 +1,87 @@
+# ./benchmarks/legacy_markdown_to_docx.py
+
+"""The line-by-line markdown to docx converter that src/utils.py used to have, kept as the benchmark baseline."""
+
+from docx import Document
+import re
+
+
+def legacy_markdown_to_docx_format(markdown_text: str, doc: Document) -> None:  
+    """Converts markdown content to a python-docx document, line by line, as src/utils.py did before its single-pass converter."""  
+    try:  
+        header_map = {  
+            'h1': 0,  
+            'h2': 1,  
+            'h3': 2,  
+            'h4': 3,  
+            'h5': 4,  
+            'h6': 5  
+        }  
+  
+        def add_styled_text(paragraph, text):  
+            """Add styled text (bold, italic, code) to a paragraph."""  
+            parts = re.split(r'(\*\*.*?\*\*|\*.*?\*|`.*?`)', text)  
+            for part in parts:  
+                if part.startswith('**') and part.endswith('**'):  
+                    run = paragraph.add_run(part[2:-2])  
+                    run.bold = True  
+                elif part.startswith('*') and part.endswith('*'):  
+                    run = paragraph.add_run(part[1:-1])  
+                    run.italic = True  
+                elif part.startswith('`') and part.endswith('`'):  
+                    run = paragraph.add_run(part[1:-1])  
+                    run.font.name = 'Courier New'  
+                else:  
+                    paragraph.add_run(part)  
+  
+        list_stack = []  
+        current_list_type = None  
+        lines = markdown_text.split('\n')  
+  
+        for line in lines:  
+            if re.match(r'#+\s', line):  
+                # Check for headers  
+                match = re.match(r'^(#+)\s+(.*)', line)  
+                if match:  
+                    header_level = len(match.group(1))  
+                    header_text = match.group(2)  
+                    doc.add_heading(header_text.strip(), level=header_map.get(f'h{header_level}', 1))  
+            elif line.startswith('```') and line.endswith('```'):  
+                # Check for code blocks  
+                code_text = line.strip('```').strip()  
+                doc.add_paragraph(code_text, style='Quote')  
+            elif line.startswith('- '):  
+                # Handle unordered list  
+                if current_list_type != 'ul':  
+                    current_list_type = 'ul'  
+                    list_stack.append(current_list_type)  
+                paragraph = doc.add_paragraph(line[2:].strip(), style='List Bullet')  
+            elif re.match(r'^\d+\.', line):  
+                # Handle ordered list  
+                if current_list_type != 'ol':  
+                    current_list_type = 'ol'  
+                    list_stack.append(current_list_type)  
+                paragraph = doc.add_paragraph(line.strip(), style='List Number')  
+            elif '|' in line and '-' not in line:  
+                # Handle table rows  
+                cells = [cell.strip() for cell in line.split('|') if cell.strip()]  
+                if not hasattr(doc, '_current_table'):  
+                    doc._current_table = doc.add_table(rows=1, cols=len(cells))  
+                    doc._current_table.style = 'Table Grid'  
+                    hdr_cells = doc._current_table.rows[0].cells  
+                    for i, cell in enumerate(cells):  
+                        hdr_cells[i].text = cell  
+                else:  
+                    row_cells = doc._current_table.add_row().cells  
+                    for i, cell in enumerate(cells):  
+                        row_cells[i].text = cell  
+            else:  
+                # Handle normal paragraphs  
+                paragraph = doc.add_paragraph()  
+                add_styled_text(paragraph, line.strip())  
+  
+        if hasattr(doc, '_current_table'):  
+            del doc._current_table  
+  
+    except Exception as e:  
+        print(f"An error occurred while converting markdown to docx format: {e}")
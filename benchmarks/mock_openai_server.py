@@ -0,0 +1,165 @@
+# ./benchmarks/mock_openai_server.py
+
+"""
+Local OpenAI-compatible server that answers chat completions with the mock backend of src/mock_llm.py.
+
+It lets the real HTTP path (OpenAI client, pooled connections, retries and fallbacks) be exercised offline.
+Point an llm_config entry at it with `"base_url": "http://127.0.0.1:8000/v1", "api_key": "mock"`.
+It keeps connections alive and counts them, so connection reuse can be checked from its stats, and streams
+responses as server-sent events when a request asks for it.
+
+    python benchmarks/mock_openai_server.py --port 8000 --latency 0.2
+    python benchmarks/mock_openai_server.py --error-rate 0.2 --error-status 503
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src.mock_llm import MockModelClient
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests, like the OpenAI API
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock-gpt-4o", "object": "model", "owned_by": "memogen"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self.send_json(200, self.server.stats())
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        with self.server.lock:
+            self.server.requests += 1
+            failed = self.server.rng.random() < self.server.error_rate
+            if failed:
+                self.server.errors += 1
+        if failed:
+            headers = {"Retry-After": "0"} if self.server.error_status == 429 else None
+            self.send_json(self.server.error_status, {"error": {"message": "Mock failure", "type": "server_error"}}, headers)
+            return
+        client = MockModelClient({**self.server.mock_config, "model": params.get("model") or "mock-gpt-4o"})
+        if params.get("stream"):
+            self.send_stream(client, params)
+        else:
+            self.send_json(200, client.create(params).model_dump(mode="json", exclude_none=True))
+
+    def send_stream(self, client, params):
+        """Sends the completion as server-sent chat.completion.chunk events, one per word, over `--latency` seconds."""
+        # The latency is spent between the chunks instead
+        completion = MockModelClient({**self.server.mock_config, "model": client.model, "mock_latency": 0}).create({**params, "stream": False})
+        content = completion.choices[0].message.content
+        chunks = re.findall(r'\S+\s*|\s+', content)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+
+        deltas = [{"role": "assistant", "content": ""}] + [{"content": chunk} for chunk in chunks]
+        for position, delta in enumerate(deltas):
+            if position and client.latency:
+                time.sleep(client.latency / len(chunks))
+            finish_reason = "stop" if position == len(deltas) - 1 else None
+            send(json.dumps({
+                "id": completion.id,
+                "object": "chat.completion.chunk",
+                "created": completion.created,
+                "model": completion.model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, completion_tokens=300, error_rate=0.0, error_status=503, seed=0, verbose=False):
+        super().__init__(address, MockOpenAIHandler)
+        self.mock_config = {"mock_latency": latency, "mock_completion_tokens": completion_tokens}
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def stats(self):
+        with self.lock:
+            return {"connections": self.connections, "requests": self.requests, "errors": self.errors}
+
+
+def serve_in_background(port=0, **options) -> MockOpenAIServer:
+    """Starts a server on a daemon thread, on a free port by default; stop it with `shutdown()`."""
+    server = MockOpenAIServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve mock chat completions on an OpenAI-compatible API.")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every completion takes (default: %(default)s)")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="approximate length of the responses (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail (default: %(default)s)")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed requests (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(("127.0.0.1", args.port), args.latency, args.completion_tokens, args.error_rate, args.error_status, verbose=args.verbose)
+    print(f"Mock OpenAI API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats()))
+        server.server_close()
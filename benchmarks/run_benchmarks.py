@@ -0,0 +1,266 @@
+# ./benchmarks/run_benchmarks.py
+
+"""
+Offline benchmarks of the memo pipeline.
+
+Times the start-up of the CLI and of agent teams, HTTP calls with and without the pooled client against the
+local mock OpenAI server, the markdown helpers of src/utils.py, the docx conversion against its former
+line-by-line version, and complete AutoMemoProduction runs on synthetic outlines, with every LLM call
+answered by the mock backend of src/mock_llm.py, so no API budget is spent.
+For every benchmark it reports the wall time, the throughput in sections per second and the peak
+memory allocated while it ran; full runs also report the time of every pipeline stage from their run report.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 5 50 --latency 0.01 --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+With --compare, the exit code is 1 when a benchmark got slower than the baseline by more than --tolerance.
+"""
+
+from contextlib import redirect_stdout
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+# The agents are built from llm_config when main is imported, so the mock backend is selected first
+os.environ["MEMOGEN_MOCK_LLM"] = "1"
+
+from src import config
+from src.mock_llm import MockModelClient
+from src.utils import parse_markdown, read_markdown_file_to_text, markdown_to_docx_format, markdown_to_docx
+from benchmarks.legacy_markdown_to_docx import legacy_markdown_to_docx_format
+from docx import Document
+
+
+def synthetic_outline(sections, seed=0):
+    """Returns a memo outline with an introduction and `sections` sections, each with a paragraph, a list and a table."""
+    client = MockModelClient({"mock_completion_tokens": 200})
+    rng = random.Random(seed)
+    parts = ["# Synthetic memo\n\nIntroduction of the memo.\n"]
+    for index in range(1, sections + 1):
+        parts.append(
+            f"## Section {index}\n\n"
+            f"{client.paragraph(rng, 80)} **Key point** and *emphasis* with `code`.\n\n"
+            f"- {client.sentence(rng)}\n- {client.sentence(rng)}\n\n"
+            f"1. {client.sentence(rng)}\n2. {client.sentence(rng)}\n\n"
+            f"| Metric | Value |\n|---|---|\n| Revenue | {index} |\n| Margin | {index * 2}% |\n"
+        )
+    return "\n".join(parts)
+
+
+def measure(function, *args, **kwargs):
+    """Runs `function` once and returns its result, wall time in seconds and peak traced memory in MiB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak / (1024 * 1024)
+
+
+def bench_helpers(sections, directory):
+    outline = synthetic_outline(sections)
+    output_folder = os.path.join(directory, f"parse_{sections}")
+    filenames, seconds, peak = measure(parse_markdown, outline, output_folder=output_folder)
+    results = [("parse_markdown", seconds, peak)]
+
+    def read_all():
+        return [read_markdown_file_to_text(filename) for filename in filenames]
+
+    _, seconds, peak = measure(read_all)
+    results.append(("read_markdown_file_to_text", seconds, peak))
+
+    def format_all(convert):
+        doc = Document()
+        for filename in filenames:
+            with open(filename, "r", encoding="utf-8") as file:
+                convert(file.read(), doc)
+        return doc
+
+    _, seconds, peak = measure(format_all, markdown_to_docx_format)
+    results.append(("markdown_to_docx_format", seconds, peak))
+    _, seconds, peak = measure(format_all, legacy_markdown_to_docx_format)
+    results.append(("markdown_to_docx_format (legacy)", seconds, peak))
+    # The whole assembly, in a process pool for large memos; only this process's memory is traced
+    with redirect_stdout(io.StringIO()):
+        _, seconds, peak = measure(markdown_to_docx, output_folder, os.path.join(directory, f"combined_{sections}.docx"), filenames=filenames)
+    results.append(("markdown_to_docx", seconds, peak))
+    return [
+        {"benchmark": name, "sections": sections, "seconds": seconds, "sections_per_second": len(filenames) / seconds if seconds else None, "peak_mib": peak}
+        for name, seconds, peak in results
+    ]
+
+
+def bench_startup(repeat=3):
+    """Times a cold `import main` and `main.py --help` in fresh interpreters, and checking out a section team cold and warm."""
+    results = []
+    for name, command in (("import main", [sys.executable, "-c", "import main"]), ("main.py --help", [sys.executable, "main.py", "--help"])):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=REPO_ROOT, check=True, capture_output=True)
+            timings.append(time.perf_counter() - start)
+        results.append({"benchmark": name, "sections": 0, "seconds": min(timings), "sections_per_second": None, "peak_mib": None})
+
+    from src.registry import AgentRegistry, DEFAULT_PROFILE
+    registry = AgentRegistry()
+    # The first checkout imports autogen and builds the agents and memo store, later ones reuse them.
+    # Not traced: tracemalloc slows imports down several times
+    for name in ("team checkout (cold)", "team checkout (warm)"):
+        start = time.perf_counter()
+        team = registry.acquire("team", *DEFAULT_PROFILE)
+        seconds = time.perf_counter() - start
+        registry.release("team", *DEFAULT_PROFILE, team)
+        results.append({"benchmark": name, "sections": 0, "seconds": seconds, "sections_per_second": None, "peak_mib": None})
+    return results
+
+
+def bench_transport(calls=50):
+    """
+    Times chat completions against the local mock OpenAI server with a new OpenAI client per call, the way every
+    agent and group chat manager used to build its own, and with new clients on the shared pooled HTTP client.
+    """
+    from benchmarks.mock_openai_server import serve_in_background
+    from src.transport import http_client
+    from openai import OpenAI
+
+    server = serve_in_background()
+    messages = [{"role": "user", "content": "Write a section"}]
+    results = []
+    try:
+        for name, shared in (("chat completions (client per agent)", False), ("chat completions (pooled client)", True)):
+            connections = server.stats()["connections"]
+
+            def complete():
+                for _ in range(calls):
+                    client = OpenAI(base_url=server.base_url, api_key="mock", http_client=http_client() if shared else None)
+                    client.chat.completions.create(model="mock-gpt-4o", messages=messages)
+                    if not shared:
+                        client.close()
+
+            _, seconds, peak = measure(complete)
+            results.append({
+                "benchmark": name,
+                "sections": 0,
+                "seconds": seconds,
+                "sections_per_second": None,
+                "peak_mib": peak,
+                "llm_calls": calls,
+                "connections": server.stats()["connections"] - connections,
+            })
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def bench_full_run(sections, directory, concurrency):
+    import main
+
+    producer = main.AutoMemoProduction(
+        topic="Synthetic benchmark",
+        audience="Benchmark readers",
+        memo_type="Financial",
+        max_concurrency=concurrency,
+        runs_directory=os.path.join(directory, "runs"),
+        docx_path=None,
+        # Every heading of the synthetic outline is written as its own section, so sizes stay comparable
+        unit_tokens=(0, None),
+    )
+    # Presetting the outline fixes the memo size, the outliner is skipped like on a resumed run
+    producer.manifest.set_outline(synthetic_outline(sections))
+    with redirect_stdout(io.StringIO()):
+        _, seconds, peak = measure(producer.run)
+    summary = producer.report.summary()
+    return {
+        "benchmark": f"AutoMemoProduction.run (concurrency {concurrency})",
+        "sections": sections,
+        "seconds": seconds,
+        "sections_per_second": (sections + 1) / seconds if seconds else None,
+        "peak_mib": peak,
+        "llm_calls": sum(agent["calls"] for agent in summary["agents"].values()),
+        "stages": {name: round(stage["seconds"], 4) for name, stage in summary["stages"].items()},
+    }
+
+
+def print_results(results):
+    print(f"{'Benchmark':<42}{'Sections':>9}{'Seconds':>10}{'Sect/s':>10}{'Peak MiB':>10}")
+    for result in results:
+        rate = "-" if result["sections_per_second"] is None else f"{result['sections_per_second']:.1f}"
+        peak = "-" if result["peak_mib"] is None else f"{result['peak_mib']:.1f}"
+        print(f"{result['benchmark']:<42}{result['sections']:>9}{result['seconds']:>10.3f}{rate:>10}{peak:>10}")
+        if "connections" in result:
+            print(f"    {result['llm_calls']} calls over {result['connections']} connections")
+        for name, seconds in sorted(result.get("stages", {}).items(), key=lambda item: -item[1]):
+            print(f"    {name:<38}{'':>9}{seconds:>10.3f}")
+
+
+def compare(results, baseline_path, tolerance):
+    """Prints the time of every benchmark against a baseline file and returns whether any of them regressed."""
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {(result["benchmark"], result["sections"]): result for result in json.load(file)["results"]}
+    regressed = False
+    print(f"\n{'Benchmark':<42}{'Sections':>9}{'Baseline s':>12}{'Now s':>10}{'Ratio':>8}")
+    for result in results:
+        previous = baseline.get((result["benchmark"], result["sections"]))
+        if previous is None or not previous["seconds"]:
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{result['benchmark']:<42}{result['sections']:>9}{previous['seconds']:>12.3f}{result['seconds']:>10.3f}{ratio:>8.2f}{flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the memo pipeline offline against the mock LLM backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500], help="numbers of outline sections (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every mock LLM call takes (default: %(default)s)")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="approximate length of the mock responses (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=config.max_concurrent_sections, help="sections written in parallel in full runs (default: %(default)s)")
+    parser.add_argument("--skip-full-run", action="store_true", help="do not benchmark complete memo runs")
+    parser.add_argument("--skip-startup", action="store_true", help="do not benchmark import and agent start-up times")
+    parser.add_argument("--skip-transport", action="store_true", help="do not benchmark HTTP calls against the local mock OpenAI server")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="compare against the results of an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (default: %(default)s)")
+    args = parser.parse_args()
+
+    # Every model tier is this dict under the mock backend, so the mock settings reach every agent main builds
+    config.mock_llm_config.update({"mock_latency": args.latency, "mock_completion_tokens": args.completion_tokens})
+
+    results = []
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # main keeps its teachability database and default outputs relative to the working directory
+        os.chdir(directory)
+        if not args.skip_startup:
+            results.extend(bench_startup())
+        if not args.skip_transport:
+            results.extend(bench_transport())
+        for sections in args.sizes:
+            results.extend(bench_helpers(sections, directory))
+            if not args.skip_full_run:
+                results.append(bench_full_run(sections, directory, args.concurrency))
+        os.chdir(working_directory)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"latency": args.latency, "completion_tokens": args.completion_tokens, "results": results}, file, indent=4)
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
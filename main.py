@@ -1,32 +1,35 @@
 # src/main.py
 
-from autogen import GroupChat, GroupChatManager
-from src.utils import parse_markdown, markdown_to_docx, read_markdown_file_to_text, write_text_to_markdown, clear_previous_results
-from src.config import llm_config
+from src.utils import parse_markdown, markdown_to_docx, read_jobs_from_jsonl
+from src.section_store import SectionStore
+from src.context import budget_neighbour_context, count_tokens
+from src.manifest import RunManifest, inputs_hash, new_run_id
+from src.gateway import LLMGateway
+from src.telemetry import RunReport, instrument_method, log_summary
+from src.events import EventStream, ndjson_writer
+from src.dedup import DEDUP_MODES, DuplicateIndex, strip_paragraphs
+from src.registry import AgentRegistry, DEFAULT_PROFILE
+from src.routing import role_model
+from src.config import review_score_threshold, max_refinement_rounds, max_concurrent_sections, section_context_token_budget, outline_unit_min_tokens, outline_unit_max_tokens, runs_directory, max_concurrent_jobs, max_inflight_llm_requests, export_trace_spans, docx_max_workers, llm_cache_mode, llm_cache_path, llm_cache_max_entries, llm_cache_ttl_seconds, dedup_mode
+from src.llm_cache import CACHE_MODES, open_response_cache
+import asyncio
 import logging
-from autogen.agentchat.contrib.capabilities.teachability import Teachability
-import chromadb
-from autogen import AssistantAgent
-from src.prompts import get_system_messages
-from src.config import llm_config
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import json
+import sys
+import threading
+import shutil
 import os
 import glob
 import re
 
-# For Development
-# from autogen.cache import Cache
-
-
 # ---------- Init
 
 topic = ""
 audience = ""
 memo_type = ""
 
-# ---------- ChromaDB Init
-
-chroma_client = chromadb.HttpClient(host='localhost', port=8000)
-
 # --------- User Input
 
 def get_user_inputs():
@@ -43,300 +46,659 @@ def get_user_inputs():
 
     return topic, audience, memo_type
 
-# --------- Agents 
-
-# Fetch all system messages using the appropriate function
-messages = get_system_messages(audience="general", memo_type="General")
-# -------- Writer
-
-writer = AssistantAgent(
-    name="Writer",
-    system_message=messages["writer_system_message"],
-    llm_config=llm_config,
-)
-
-second_writer = AssistantAgent(
-    name="Writer",
-    system_message=messages["writer_system_message"],
-    llm_config=llm_config,
-)
-
-outliner = AssistantAgent(
-    name="Writer",
-    system_message=messages["outliner_system_message"],
-    llm_config=llm_config,
-)
-
-# -------- Reviewers
-
-critic = AssistantAgent(
-    name="Critic",
-    is_termination_msg=lambda x: x.get("content", "").find("TERMINATE") >= 0,
-    llm_config=llm_config,
-    system_message=messages["critic_system_message"],
-)
-
-layman_reviewer = AssistantAgent(
-    name="Layman Reviewer",
-    description="A reviewer that makes sure a laywoman would fully understand the content provided to her.",
-    llm_config=llm_config,
-    system_message=messages["layman_system_message"],
-)
-
-financial_reviewer = AssistantAgent(
-    name="Financial Reviewer",
-    description='A reviewer that makes sure financial justification are credible',
-    llm_config=llm_config,
-    system_message=messages["financial_reviewer_system_message"],
-)
-
-quality_reviewer = AssistantAgent(
-    name="Quality Assurance Reviewer",
-    description="a reviewer that makes sure that claims are well justified",
-    llm_config=llm_config,
-    system_message=messages["quality_system_message"],
-)
-
-meta_reviewer = AssistantAgent(
-    name="Meta Reviewer",
-    llm_config=llm_config,
-    system_message="You are a meta reviewer, you aggragate and review "
-    "the work of other reviewers and give a final suggestion on the content.",
-)
-
-# Instantiate a Teachability object. Its parameters are all optional.
-teachability = Teachability(
-    reset_db=True,  # Use True to force-reset the memo DB, and False to use an existing DB.
-    verbosity=1,
-    recall_threshold=3,
-    llm_config=llm_config,
-    max_num_retrievals=50,
-)
-# --------- Main Application Logic
+# --------- Agents
 
-def reflection_message(recipient, messages, sender, config):
-    return f'''Review the following content. \n\n {recipient.chat_messages_for_summary(sender)[-1]['content']}'''
-
-review_chats = [
-    {
-     "recipient": layman_reviewer,
-     "message": reflection_message,
-     "summary_method": "reflection_with_llm",
-     "summary_args": {"summary_prompt" :
-        "Return review into as JSON object only:"
-        "{'Reviewer': '', 'Review': ''}. Here Reviewer should be your role",},
-     "max_turns": 1},
-    {
-    "recipient": financial_reviewer, "message": reflection_message,
-     "summary_method": "reflection_with_llm",
-     "summary_args": {"summary_prompt" :
-        "Return review into as JSON object only:"
-        "{'Reviewer': '', 'Review': ''}.",},
-     "max_turns": 1},
-    {"recipient": quality_reviewer, "message": reflection_message,
-     "summary_method": "reflection_with_llm",
-     "summary_args": {"summary_prompt" :
-        "Return review into as JSON object only:"
-        "{'Reviewer': '', 'Review': ''}",},
-     "max_turns": 1},
-     {"recipient": meta_reviewer,
-      "message": "Aggregrate feedback from all reviewers and give final suggestions on the writing. NEVER suggest to improve the memo section based on additional sections or more information that would be contained in other different sections.  Make sure your suggestion is concise (within 3 bullet points), concrete and to the point.  ALWAYS offer suggestion that supports the deduplication of the writer's content for the current and future sections based on the previous sections.",
-     "max_turns": 1},
-]
-
-critic.register_nested_chats(
-    review_chats,
-    trigger=writer,
-)
-# Now add teachability to the agent.
-teachability.add_to_agent(critic)
-teachability.add_to_agent(meta_reviewer)
-# teachability.add_to_agent(writer)
+# Agents are built when a memo first needs them and reused by the memos after it
+agent_registry = AgentRegistry()
+
+# --------- Main Application Logic
 
 class AutoMemoProduction:
-    def __init__(self, topic, audience, memo_type):
+    def __init__(self, topic, audience, memo_type, max_concurrency=max_concurrent_sections, cache=None, context_token_budget=section_context_token_budget, run_id=None, runs_directory=runs_directory, agent_profile=DEFAULT_PROFILE, agents=None, gateway=None, docx_path="./src/result/result.docx", export_spans=export_trace_spans, base_run=None, score_threshold=review_score_threshold, max_refinements=max_refinement_rounds, unit_tokens=(outline_unit_min_tokens, outline_unit_max_tokens), events=None, dedup=dedup_mode):
+        """
+        Args:
+            agent_profile (tuple): The (audience, memo_type) the agents' system messages are written for.
+            agents (AgentRegistry): Registry the memo checks its agents out of, by default the module-level one.
+            gateway (LLMGateway): Gateway every LLM call of this memo's agents goes through.
+            docx_path (str): Where the final document is copied to, besides the run directory. None to skip.
+            export_spans (bool): Also export every timing span of the run report to spans.jsonl.
+            base_run (str): Id of an earlier run whose outline and sections are reused where their inputs did not change.
+            score_threshold (float): Review score out of 10 from which a draft is kept without refinement. None refines every section once.
+            max_refinements (int): Refinements of a section that keeps scoring below the threshold.
+            unit_tokens (tuple): Minimum and maximum outline tokens of a section; a maximum of None makes every heading a section.
+            events (EventStream): Stream the progress of the run and the writer's tokens are emitted to, by default a new one.
+            dedup (str): What to do with paragraphs that nearly duplicate another section's: "flag", "strip" or "off".
+        """
         logging.info(f"Initializing AgentManager")
         self.topic = topic
         self.audience = audience
         self.memo_type = memo_type
+        self.max_concurrency = max(1, max_concurrency)
+        self.cache = cache
+        self.gateway = gateway or LLMGateway()
+        self.export_spans = export_spans
+        self.context_token_budget = context_token_budget
+        self.score_threshold = score_threshold
+        self.max_refinements = max(1, max_refinements)
+        self.min_unit_tokens, self.max_unit_tokens = unit_tokens
+        self.agent_profile = tuple(agent_profile)
+        self.agents = agents or agent_registry
+        self.run_id = run_id or new_run_id()
+        self.run_directory = os.path.join(runs_directory, self.run_id)
+        self.events = events or EventStream(self.run_id)
+        self.sections_directory = os.path.join(self.run_directory, "sections")
+        self.docx_path = docx_path
+        self.dedup = dedup
+        if os.path.exists(os.path.join(self.run_directory, "manifest.json")):
+            self.manifest = RunManifest.load(self.run_directory)
+        else:
+            self.manifest = RunManifest.create(self.run_directory, self.run_id, topic, audience, memo_type, self.settings())
+        self.sections = SectionStore(self.sections_directory)
+        self.duplicates = DuplicateIndex() if dedup != "off" else None
+        self.base_manifest = RunManifest.load(os.path.join(runs_directory, base_run)) if base_run else None
+        self.report = RunReport(self.run_id)
+        self._worker = threading.local()
+        self._worker_teams = []
+
+    def settings(self):
+        """The options that decide what the memo's sections become, saved in the manifest for `resume`."""
+        return {
+            "agent_profile": list(self.agent_profile),
+            "context_token_budget": self.context_token_budget,
+            "score_threshold": self.score_threshold,
+            "max_refinements": self.max_refinements,
+            "unit_tokens": [self.min_unit_tokens, self.max_unit_tokens],
+            "dedup": self.dedup,
+        }
+
+    @classmethod
+    def resume(cls, run_id, runs_directory=runs_directory, **kwargs):
+        """
+        Reopens an interrupted run, skipping every step its manifest records as completed.
+        The run gets the agent profile and settings it was started with, unless `kwargs` override them.
+        """
+        manifest = RunManifest.load(os.path.join(runs_directory, run_id))
+        settings = dict(manifest.settings)
+        if "agent_profile" in settings:
+            settings["agent_profile"] = tuple(settings["agent_profile"])
+        if "unit_tokens" in settings:
+            settings["unit_tokens"] = tuple(settings["unit_tokens"])
+        return cls(
+            topic=manifest.data["topic"],
+            audience=manifest.data["audience"],
+            memo_type=manifest.data["memo_type"],
+            run_id=run_id,
+            runs_directory=runs_directory,
+            **{**settings, **kwargs},
+        )
 
     def create_outline(self):
         message=f"Create an outline for a {self.memo_type} memo on the topic {self.topic} optimized for the audience: {self.audience}."
-        outline =outliner.generate_reply(messages=[{"content": message, "role": "user"}])
+        with self.agents.use("outliner", *self.agent_profile) as outliner:
+            outliner.client_cache = self.cache
+            self.gateway.attach(outliner, self.report)
+            with self.report.stage("create_outline"):
+                outline =outliner.generate_reply(messages=[{"content": message, "role": "user"}])
         logging.info(f"Outline created: {outline}")
         return outline
 
+    def outline_inputs(self):
+        """Hash of everything the outline is generated from."""
+        messages = self.agents.messages(*self.agent_profile)
+        return inputs_hash(self.topic, self.audience, self.memo_type, messages["outliner_system_message"], role_model("outliner"))
+
+    def section_inputs(self, markdown_filenames):
+        """
+        Hashes everything each section's output depends on: its writer prompts without the neighbour context,
+        the agents' system messages, the model and the context budget, and the summaries of its direct neighbours.
+        Neighbours only count through their outline summaries, so an edit elsewhere in the outline does not change
+        a section's inputs unless it changes a neighbour's heading or opening.
+        """
+        contexts = [self.sections.context(name) for name in markdown_filenames]
+        count = len(contexts)
+        messages = self.agents.messages(*self.agent_profile)
+        inputs = []
+        for index, context in enumerate(contexts):
+            inputs.append(inputs_hash(
+                self.section_message(index, count, context.text, "", ""),
+                self.section_message(index, count, context.text, "", "", refine=True),
+                messages,
+                role_model("writer"),
+                self.context_token_budget,
+                [contexts[i].summary for i in (index - 1, index + 1) if 0 <= i < count],
+            ))
+        return inputs
+
+    def reused_outline(self):
+        """Returns the outline of the base run if it was created from the same inputs, None otherwise."""
+        if self.base_manifest is None or self.base_manifest.outline_inputs != self.outline_inputs():
+            return None
+        logging.info(f"Reusing the outline of run {self.base_manifest.run_id}")
+        return self.base_manifest.outline
+
+    def reuse_sections(self, markdown_filenames):
+        """Copies the refined sections of the base run whose inputs did not change, so only the others are written."""
+        if self.base_manifest is None:
+            return []
+        reused = []
+        with self.report.stage("reuse_sections"):
+            reusable = self.base_manifest.reusable_sections()
+            for filename in markdown_filenames:
+                markdown_string = reusable.get(self.manifest.inputs(filename))
+                if markdown_string is not None:
+                    self.sections.write(filename, markdown_string)
+                    self.manifest.mark(filename, "refined", markdown_string)
+                    reused.append(filename)
+        logging.info(f"Reused {len(reused)} of {len(markdown_filenames)} sections from run {self.base_manifest.run_id}, regenerating the others")
+        return reused
+
     def parse_outline_to_markdown_chunks(self, outline_str):
-        filenames = parse_markdown(outline_str)
+        with self.report.stage("parse_outline"):
+            filenames = self.sections.load(parse_markdown(outline_str, output_folder=self.sections_directory, max_unit_tokens=self.max_unit_tokens, min_unit_tokens=self.min_unit_tokens))
         logging.info(f"Parsed markdown files: {filenames}")
         return filenames
 
-    def write_sections(self, markdown_filenames):  
-        def custom_speaker_selection_func(last_speaker, groupchat):  
-            messages = groupchat.messages  
-            if len(messages) <= 1:  
-                return writer  
-            if last_speaker is writer:  
-                return critic  
-            if last_speaker in [layman_reviewer, financial_reviewer, quality_reviewer, meta_reviewer]:  
-                return critic if last_speaker != meta_reviewer else writer  
-            if last_speaker is critic:  
-                return "random" if len(messages) < 3 else meta_reviewer  
-            else:  
-                return "random"  
-
-
-        for index, filename in enumerate(markdown_filenames):  
-            current_content = read_markdown_file_to_text(filename)  
-  
-            # Read all previous sections  
-            previous_content = ""  
-            if index > 0:  
-                previous_content = "\n\n".join(read_markdown_file_to_text(markdown_filenames[i]) for i in range(index))  
-  
-            # Read all next sections  
-            next_content = ""  
-            if index < len(markdown_filenames) - 1:  
-                next_content = "\n\n".join(read_markdown_file_to_text(markdown_filenames[i]) for i in range(index + 1, len(markdown_filenames)))  
-  
-            # Construct message based on position in the list  
-            if index == 0:  
-                # First section  
-                message = (
-                    f"AUDIENCE:\n\n"    
-                    fr"{self.audience}\n\n"  
-                    f"---\n\n"  
-                    f"NEXT SECTION:\n\n"  
-                    f"{next_content}\n\n"  
-                    f"---\n\n"  
-                    f"FOCUS SECTION :\n\n"  
-                    f"{current_content}\n\n"  
-                    f"Produce a simple and short introduction for this {self.memo_type} memo on the topic of {self.topic} optimized for AUDIENCE provided above. ALWAYS deduplicate your content based on the sections provided:"  
-                )  
-            elif index == len(markdown_filenames) - 1:  
-                # Last section  
-                message = (
-                    f"AUDIENCE:\n\n"    
-                    fr"{self.audience}\n\n"  
-                    f"---\n\n"  
-                    f"PREVIOUS SECTION:\n\n"  
-                    f"{previous_content}\n\n"  
-                    f"---\n\n"  
-                    f"FOCUS SECTION :\n\n"  
-                    f"{current_content}\n\n"  
-                    f"Produce a detailed section based on the section of {self.memo_type} memo on the topic of {self.topic} optimized for AUDIENCE provided above. ALWAYS deduplicate your content based on the sections provided:"  
-                )  
-            else:  
-                # Middle sections  
-                message = (                    
-                    f"AUDIENCE:\n\n"    
-                    fr"{self.audience}\n\n"  
-                    f"---\n\n"  
-                    f"PREVIOUS SECTION:\n\n"  
-                    f"{previous_content}\n\n"  
-                    f"---\n\n"  
-                    f"NEXT SECTION:\n\n"  
-                    f"{next_content}\n\n"  
-                    f"---\n\n"  
-                    f"FOCUS SECTION :\n\n"  
-                    f"{current_content}\n\n"  
-                    f"---\n\n"  
-                    f"Produce a detailed section based on the section of {self.memo_type} memo on the topic of {self.topic} optimized for AUDIENCE provided above. ALWAYS deduplicate your content based on the sections provided:"  
-                )  
-            # Initialize GroupChat  
-            groupchat = GroupChat(  
-                agents=[writer, critic, layman_reviewer, financial_reviewer, quality_reviewer, meta_reviewer],  
-                messages=[],  
-                max_round=2,  
-                speaker_selection_method=custom_speaker_selection_func,  
-            )  
-            
-            manager = GroupChatManager(groupchat=groupchat, llm_config=llm_config)  
-            # Start chat with writer
-            # with Cache.disk(cache_seed=42) as cache:    
-            result = writer.initiate_chat(manager, message=message)  
-            final_message = manager.chat_messages[writer][-1]['content']
-            write_text_to_markdown(final_message, filename)     
-        
-        # Second pass for improvement  
-        for index, filename in enumerate(markdown_filenames):  
-            current_content = read_markdown_file_to_text(filename)  
-            previous_content = ""  
-            if index > 0:  
-                previous_content = "\n\n".join(read_markdown_file_to_text(markdown_filenames[i]) for i in range(index))  
-            next_content = ""  
-            if index < len(markdown_filenames) - 1:  
-                next_content = "\n\n".join(read_markdown_file_to_text(markdown_filenames[i]) for i in range(index + 1, len(markdown_filenames)))  
-  
-            if index == 0:  
-                message = (
-                    f"AUDIENCE:\n\n"    
-                    fr"{self.audience}\n\n"  
-                    f"---\n\n"   
-                    f"NEXT SECTION:\n\n"  
-                    f"{next_content}\n\n"  
-                    f"---\n\n"  
-                    f"FOCUS SECTION :\n\n"  
-                    f"{current_content}\n\n"  
-                    f"Refine the introduction for this {self.memo_type} memo optimized for AUDIENCE provided above. return your section with titles and subtitles or bullet points in markdown format when appropriate. ALWAYS deduplicate your content based on the sections provided:"  
-                )  
-            elif index == len(markdown_filenames) - 1:  
-                message = (
-                    f"AUDIENCE:\n\n"     
-                    fr"{self.audience}\n\n"  
-                    f"---\n\n"  
-                    f"PREVIOUS SECTION:\n\n"  
-                    f"{previous_content}\n\n"  
-                    f"---\n\n"  
-                    f"FOCUS SECTION :\n\n"  
-                    f"{current_content}\n\n"  
-                    f"Refine the detailed section based on the section of {self.memo_type} memo optimized for AUDIENCE provided above. return your section with titles and subtitlesor bullet points in markdown format when appropriate. ALWAYS deduplicate your content based on the sections provided:"  
-                )  
-            else:  
-                message = (
-                    f"AUDIENCE:\n\n"    
-                    fr"{self.audience}\n\n"  
-                    f"---\n\n" 
-                    f"PREVIOUS SECTION:\n\n"  
-                    f"{previous_content}\n\n"  
-                    f"---\n\n"  
-                    f"NEXT SECTION:\n\n"  
-                    f"{next_content}\n\n"  
-                    f"---\n\n"  
-                    f"FOCUS SECTION :\n\n"  
-                    f"{current_content}\n\n"  
-                    f"---\n\n"
- 
-                    f"Refine the detailed section based on the section of {self.memo_type} memo optimized for AUDIENCE provided above. return your section with titles and subtitles or bullet points in markdown format when appropriate. ALWAYS deduplicate your content based on the sections provided:"  
-                )  
-  
-            groupchat = GroupChat(  
-                agents=[writer, critic, layman_reviewer, financial_reviewer, quality_reviewer, meta_reviewer],  
-                messages=[],  
-                max_round=2,  
-                speaker_selection_method=custom_speaker_selection_func,  
-            )  
-  
-            manager = GroupChatManager(groupchat=groupchat, llm_config=llm_config)  
-            result = writer.initiate_chat(manager, message=message)  
-            final_message = manager.chat_messages[writer][-1]['content']  
-            write_text_to_markdown(final_message, filename)  
+    def section_message(self, index, count, current_content, previous_content, next_content, refine=False, feedback=None, repeated=None):
+        """
+        Builds the writer prompt for the section at `index` out of `count` sections.
+        `repeated` lists the Overlaps of passages the focus section repeats from earlier sections, for the writer to fix.
+        """
+        if refine:
+            if index == 0:
+                instruction = f"Refine the introduction for this {self.memo_type} memo optimized for AUDIENCE provided above. return your section with titles and subtitles or bullet points in markdown format when appropriate. ALWAYS deduplicate your content based on the sections provided:"
+            else:
+                instruction = f"Refine the detailed section based on the section of {self.memo_type} memo optimized for AUDIENCE provided above. return your section with titles and subtitles or bullet points in markdown format when appropriate. ALWAYS deduplicate your content based on the sections provided:"
+        elif index == 0:
+            instruction = f"Produce a simple and short introduction for this {self.memo_type} memo on the topic of {self.topic} optimized for AUDIENCE provided above. ALWAYS deduplicate your content based on the sections provided:"
+        else:
+            instruction = f"Produce a detailed section based on the section of {self.memo_type} memo on the topic of {self.topic} optimized for AUDIENCE provided above. ALWAYS deduplicate your content based on the sections provided:"
+
+        # The focus section comes first, followed by the context of the surrounding sections
+        message = (
+            f"AUDIENCE:\n\n"
+            fr"{self.audience}\n\n"
+            f"---\n\n"
+            f"FOCUS SECTION :\n\n"
+            f"{current_content}\n\n"
+            f"---\n\n"
+        )
+        if index > 0:
+            message += (
+                f"PREVIOUS SECTION:\n\n"
+                f"{previous_content}\n\n"
+                f"---\n\n"
+            )
+        if index < count - 1:
+            message += (
+                f"NEXT SECTION:\n\n"
+                f"{next_content}\n\n"
+                f"---\n\n"
+            )
+        if feedback:
+            message += (
+                f"REVIEWER FEEDBACK:\n\n"
+                f"{feedback}\n\n"
+                f"---\n\n"
+            )
+        if repeated:
+            passages = "\n\n".join(f"{overlap.paragraph}\n(repeats {self.sections.context(overlap.other_section).heading}: {overlap.other_paragraph})" for overlap in repeated)
+            message += (
+                f"REPEATED PASSAGES:\n\n"
+                f"{passages}\n\n"
+                f"---\n\n"
+            )
+            instruction = f"Rewrite or remove the REPEATED PASSAGES of the focus section, which earlier sections already cover. {instruction}"
+        return message + instruction
+
+    def build_section_message(self, index, contexts, refine=False, feedback=None, repeated=None):
+        """Builds the writer prompt for a section from the SectionContext of every section.
+
+        Without a token budget the full text of every other section is included. With one, the neighbour
+        context is compressed to fit what is left of the budget after the focus section and instructions.
+        """
+        count = len(contexts)
+        current_content = contexts[index].text
+        if self.context_token_budget is None:
+            previous_content = "\n\n".join(context.text for context in contexts[:index])
+            next_content = "\n\n".join(context.text for context in contexts[index + 1:])
+        else:
+            model = role_model("writer")
+            skeleton = self.section_message(index, count, current_content, "", "", refine=refine, feedback=feedback, repeated=repeated)
+            remaining = max(0, self.context_token_budget - count_tokens(skeleton, model))
+            previous_content, next_content = budget_neighbour_context(contexts[:index], contexts[index + 1:], remaining, model)
+        return self.section_message(index, count, current_content, previous_content, next_content, refine=refine, feedback=feedback, repeated=repeated)
+
+    def emit(self, event_type, **fields):
+        self.events.emit(event_type, run_id=self.run_id, **fields)
+
+    def write_section(self, team, filename, message, state, refinement=0):
+        """
+        Runs one writer/reviewer GroupChat for a section, saves the writer's final message and checkpoints it as `state`.
+        `refinement` numbers the refinements of the second pass, 0 is the first draft. The writer's tokens are emitted as they stream.
+        """
+        section = os.path.basename(filename)
+        manager = team.group_chat_manager()
+        self.gateway.attach(manager, self.report)
+        self.emit("section_started", section=section, refinement=refinement)
+        # Start chat with writer
+        with self.report.stage("section", section=section, state=state), self.events.stream_tokens(run_id=self.run_id, section=section):
+            result = team.writer.initiate_chat(manager, message=message, cache=self.cache)
+        final_message = manager.chat_messages[team.writer][-1]['content']
+        self.end_section(team, section, manager)
+        markdown_string = self.check_duplicates(filename, self.sections.write(filename, final_message))
+        self.manifest.mark(filename, state, markdown_string)
+        if refinement:
+            self.emit("section_refined", section=section, refinement=refinement, markdown=markdown_string)
+        else:
+            self.emit("section_drafted", section=section, markdown=markdown_string)
+        return final_message
+
+    def index_sections(self, markdown_filenames):
+        """Indexes the current version of every section for the near-duplicate check."""
+        if self.duplicates is None:
+            return
+        with self.report.stage("index_sections"):
+            for filename in markdown_filenames:
+                self.duplicates.update(filename, self.sections.markdown(filename))
+
+    def repeated_passages(self, filename):
+        """Overlaps of a section with the sections before it in the memo; the later of two sections is the one to fix."""
+        if self.duplicates is None:
+            return []
+        order = {name: position for position, name in enumerate(self.manifest.filenames)}
+        return [overlap for overlap in self.duplicates.overlaps(filename) if order.get(overlap.other_section, -1) < order.get(filename, -1)]
+
+    def check_duplicates(self, filename, markdown_string):
+        """
+        Re-indexes a section that was just written and reports its paragraphs that nearly duplicate another
+        section's, without any LLM call. In "strip" mode the passages it repeats from earlier sections are
+        removed from it. Returns the section's markdown.
+        """
+        if self.duplicates is None:
+            return markdown_string
+        section = os.path.basename(filename)
+        with self.report.stage("check_duplicates", section=section) as attributes:
+            self.duplicates.update(filename, markdown_string)
+            stripped = self.repeated_passages(filename) if self.dedup == "strip" else []
+            if stripped:
+                markdown_string = self.sections.write(filename, strip_paragraphs(markdown_string, [overlap.paragraph for overlap in stripped]))
+                self.duplicates.update(filename, markdown_string)
+            overlaps = self.duplicates.overlaps(filename)
+            attributes["duplicates"] = len(overlaps)
+        paragraphs = self.duplicates.paragraph_count(filename)
+        max_score = round(max((overlap.score for overlap in overlaps), default=0.0), 3)
+        overlap = round(len(overlaps) / paragraphs, 3) if paragraphs else 0.0
+        self.report.record_overlaps(section, paragraphs=paragraphs, duplicates=len(overlaps), overlap=overlap, max_score=max_score, stripped=len(stripped))
+        if overlaps or stripped:
+            logging.info(f"Near-duplicates: {section} shares {len(overlaps)} of {paragraphs} paragraphs with other sections (similarity up to {max_score:g}), {len(stripped)} stripped")
+        self.emit(
+            "section_checked",
+            section=section,
+            paragraphs=paragraphs,
+            duplicates=[{"paragraph": overlap.paragraph, "other_section": os.path.basename(overlap.other_section), "score": overlap.score} for overlap in overlaps],
+            stripped=len(stripped),
+        )
+        return markdown_string
+
+    def record_overlaps(self):
+        """Records the overlap scores of the final version of every section, once later sections may have removed what they repeated."""
+        if self.duplicates is None:
+            return
+        for filename, scores in self.duplicates.scores().items():
+            self.report.record_overlaps(os.path.basename(filename), **scores)
+
+    def end_section(self, team, section, manager=None):
+        """Trims the team's chat histories once it is done with a section, recording their size and the process memory."""
+        history_messages, _ = team.history_size()
+        team.end_section(manager)
+        kept_messages, kept_chars = team.history_size()
+        self.report.record_memory(section, history_messages=history_messages, history_messages_kept=kept_messages, history_chars_kept=kept_chars)
+
+    def score_section(self, team, filename):
+        """Has the team's scorer rate a section in one call, returning the score, None if it gave none."""
+        with self.report.stage("score_section", section=os.path.basename(filename)) as attributes:
+            attributes["score"] = team.score_section(self.sections.markdown(filename))
+        return attributes["score"]
+
+    def review_section(self, team, filename):
+        """Has the team's reviewers review a section, returning the meta reviewer's feedback."""
+        with self.report.stage("review_section", section=os.path.basename(filename)):
+            review = team.review_section(self.sections.markdown(filename), cache=self.cache)
+        self.end_section(team, os.path.basename(filename))
+        return review
+
+    def refine_section(self, team, index, markdown_filenames):
+        """
+        Second pass of a section, behind the quality gate.
+
+        The draft is scored first, with one call of the scorer, and kept as it is if it scores at least the
+        threshold. Only otherwise do the reviewers review it, and it is refined with the meta reviewer's feedback
+        and scored again, until it passes or has been refined `max_refinements` times; the last refinement is
+        kept without another score. A draft that repeats
+        passages of earlier sections does not pass whatever its score, and the refinement gets those passages
+        to fix. Every decision is logged.
+        """
+        filename = markdown_filenames[index]
+        section = os.path.basename(filename)
+        if self.score_threshold is None:
+            contexts = [self.sections.context(name) for name in markdown_filenames]
+            message = self.build_section_message(index, contexts, refine=True, repeated=self.repeated_passages(filename))
+            return self.write_section(team, filename, message, "refined", refinement=1)
+        for refinement in range(1, self.max_refinements + 1):
+            score = self.score_section(team, filename)
+            repeated = self.repeated_passages(filename)
+            accepted = score is not None and score >= self.score_threshold and not repeated
+            self.emit("section_reviewed", section=section, score=score, threshold=self.score_threshold, accepted=accepted, repeated=len(repeated))
+            if accepted:
+                logging.info(f"Quality gate: {section} scored {score:g} >= {self.score_threshold:g} after {refinement - 1} refinement(s), kept")
+                self.manifest.mark(filename, "refined", self.sections.markdown(filename))
+                return
+            last = score is None or refinement == self.max_refinements
+            if score is None:
+                logging.info(f"Quality gate: {section} got no score, refining once")
+            elif score >= self.score_threshold:
+                logging.info(f"Quality gate: {section} scored {score:g} but repeats {len(repeated)} passage(s) of earlier sections, refinement {refinement}/{self.max_refinements}")
+            else:
+                logging.info(f"Quality gate: {section} scored {score:g} < {self.score_threshold:g}, refinement {refinement}/{self.max_refinements}")
+            feedback = self.review_section(team, filename)
+            contexts = [self.sections.context(name) for name in markdown_filenames]
+            message = self.build_section_message(index, contexts, refine=True, feedback=feedback, repeated=repeated)
+            # Sections still being refined stay drafted, so a resumed run reviews them again
+            self.write_section(team, filename, message, "refined" if last else "drafted", refinement=refinement)
+            if last:
+                return
+
+    def write_sections(self, markdown_filenames):
+        with self.report.stage("write_sections", sections=len(markdown_filenames), concurrency=self.max_concurrency):
+            if self.max_concurrency > 1:
+                self.write_sections_concurrently(markdown_filenames)
+            else:
+                self.write_sections_sequentially(markdown_filenames)
+
+    def write_sections_sequentially(self, markdown_filenames):
+        with self.agents.use("team", *self.agent_profile) as team:
+            self.prepare_team(team)
+            for refine in (False, True):
+                # The second pass reviews every section against the drafts of the first pass and refines those that fall short
+                state = "refined" if refine else "drafted"
+                for index, filename in enumerate(markdown_filenames):
+                    if self.manifest.reached(filename, state):
+                        continue
+                    if refine:
+                        self.refine_section(team, index, markdown_filenames)
+                        continue
+                    contexts = [self.sections.context(name) for name in markdown_filenames]
+                    message = self.build_section_message(index, contexts)
+                    self.write_section(team, filename, message, state)
+
+    def prepare_team(self, team):
+        """Connects a team to this memo's LLM cache, gateway and run report."""
+        team.use_cache(self.cache)
+        team.report = self.report
+        self.gateway.attach_all(team.members, self.report)
+        # Timed on the team's own Teachability: its memo store is shared by every team and run of the memo type
+        instrument_method(team.teachability, "_retrieve_relevant_memos", "teachability.retrieve", self.report)
+
+    def worker_team(self):
+        """Returns the agent team checked out by the calling worker thread, checking one out on first use."""
+        if not hasattr(self._worker, "team"):
+            self._worker.team = self.agents.acquire("team", *self.agent_profile)
+            self._worker_teams.append(self._worker.team)
+            self.prepare_team(self._worker.team)
+        return self._worker.team
+
+    def release_worker_teams(self):
+        """Returns the teams of the section workers to the registry once the workers are done."""
+        for team in self._worker_teams:
+            self.agents.release("team", *self.agent_profile, team)
+        self._worker_teams.clear()
+
+    def write_sections_concurrently(self, markdown_filenames):
+        """Drafts sections in parallel and pipelines the refinement pass.
+
+        First drafts only see the outline text of the other sections, so they do not depend on each other.
+        A section is refined as soon as it and its direct neighbours are drafted, against the latest
+        available text of every other section.
+        """
+        count = len(markdown_filenames)
+        outline = [self.sections.context(name) for name in markdown_filenames]
+
+        def run(index, refine):
+            if refine:
+                return self.refine_section(self.worker_team(), index, markdown_filenames)
+            message = self.build_section_message(index, outline)
+            self.write_section(self.worker_team(), markdown_filenames[index], message, "drafted")
+
+        def neighbours(index):
+            return [i for i in (index - 1, index, index + 1) if 0 <= i < count]
+
+        def schedule_refinements(index):
+            for candidate in neighbours(index):
+                if candidate not in scheduled and all(i in drafted for i in neighbours(candidate)):
+                    scheduled.add(candidate)
+                    ready.append(candidate)
+
+        # Sections checkpointed by an earlier attempt of this run are not written again
+        drafted = {i for i, name in enumerate(markdown_filenames) if self.manifest.reached(name, "drafted")}
+        scheduled = {i for i, name in enumerate(markdown_filenames) if self.manifest.reached(name, "refined")}
+        drafts = [i for i in range(count) if i not in drafted]
+        ready = []
+        for index in sorted(drafted):
+            schedule_refinements(index)
+        pending = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                while drafts or ready or pending:
+                    # Refinements go first so that finished sections are not held back by the remaining drafts
+                    while len(pending) < self.max_concurrency and (ready or drafts):
+                        if ready:
+                            index = ready.pop(0)
+                            pending[executor.submit(run, index, True)] = (index, True)
+                        else:
+                            index = drafts.pop(0)
+                            pending[executor.submit(run, index, False)] = (index, False)
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, refine = pending.pop(future)
+                        future.result()
+                        if refine:
+                            logging.info(f"Refined section {index + 1}/{count}")
+                            continue
+                        logging.info(f"Drafted section {index + 1}/{count}")
+                        drafted.add(index)
+                        schedule_refinements(index)
+        finally:
+            self.release_worker_teams()
 
     def combine_sections_to_docx(self):
-        markdown_to_docx()
-        logging.info(f"Combined markdown sections into docx: /src/result/result.docx")
+        run_docx_path = os.path.join(self.run_directory, "result.docx")
+        with self.report.stage("combine_docx"):
+            markdown_to_docx(self.sections_directory, run_docx_path, filenames=self.manifest.filenames, max_workers=docx_max_workers)
+        if self.docx_path:
+            shutil.copyfile(run_docx_path, self.docx_path)
+        self.manifest.set_docx(run_docx_path)
+        self.emit("docx_written", path=run_docx_path)
+        logging.info(f"Combined markdown sections into docx: {self.docx_path or run_docx_path}")
+        return run_docx_path
 
     def run(self):
-        clear_previous_results("./src/result/intermediate_results", "./src/result/result.docx")  
-        outline = self.create_outline()
-        markdown_filenames = self.parse_outline_to_markdown_chunks(outline)
-        self.write_sections(markdown_filenames)
-        self.combine_sections_to_docx()
+        logging.info(f"Memo run {self.run_id}, resume it with: python main.py --resume {self.run_id}")
+        self.emit("run_started", topic=self.topic, audience=self.audience, memo_type=self.memo_type)
+        try:
+            with self.report.stage("run", run_id=self.run_id):
+                outline = self.manifest.outline
+                if outline is None:
+                    outline = self.reused_outline() or self.create_outline()
+                    self.manifest.set_outline(outline, self.outline_inputs())
+                    # Edit this copy and pass it to --outline, with --from-run, to regenerate only the sections that changed
+                    with open(os.path.join(self.run_directory, "outline.md"), "w", encoding="utf-8") as file:
+                        file.write(outline)
+                self.emit("outline_created", outline=outline)
+
+                if self.manifest.filenames:
+                    restored = self.manifest.verify_sections()
+                    if restored:
+                        logging.warning(f"Sections missing or changed since their checkpoint, restarting them from the outline: {restored}")
+                    markdown_filenames = self.sections.load(self.manifest.filenames)
+                else:
+                    markdown_filenames = self.parse_outline_to_markdown_chunks(outline)
+                    self.manifest.set_sections(markdown_filenames, [self.sections.markdown(name) for name in markdown_filenames], self.section_inputs(markdown_filenames))
+                    self.reuse_sections(markdown_filenames)
+
+                self.index_sections(markdown_filenames)
+                self.write_sections(markdown_filenames)
+                self.record_overlaps()
+                docx_path = self.combine_sections_to_docx()
+        except BaseException as e:
+            self.emit("run_failed", error=repr(e))
+            raise
+        finally:
+            # The report is saved for failed runs too, they are the ones worth investigating
+            report_path = self.report.save(self.run_directory, export_spans=self.export_spans)
+            logging.info(f"Run report saved at: {report_path}")
+        log_summary(self.report)
+        if self.cache is not None:
+            logging.info(f"LLM cache: {self.cache.stats()}")
+        logging.info(f"LLM scheduler: {self.gateway.stats()}")
+        for store in self.agents.memo_stores():
+            # Persists when the memos retrieved during the run were recalled, which decides what gets evicted
+            store.save()
+            logging.info(f"Teachability memos: {store.stats()}")
+        self.emit("run_finished", docx=docx_path)
+        return docx_path
+
+    async def astream(self):
+        """
+        Runs the memo in a worker thread and yields its events as they are emitted, up to "run_finished".
+        An exception of the run is raised once its "run_failed" event has been yielded.
+        """
+        events = self.events.__aiter__()
+        run = asyncio.ensure_future(asyncio.to_thread(self.run))
+        run.add_done_callback(lambda _: events.close())
+        async for event in events:
+            # A shared stream also carries the events of other runs
+            if event["run_id"] == self.run_id:
+                yield event
+        await run
+
+def run_batch(jobs, batch_id=None, max_jobs=max_concurrent_jobs, max_inflight_requests=max_inflight_llm_requests, cache=None, max_concurrency=max_concurrent_sections, runs_directory=runs_directory, export_spans=export_trace_spans, events=None, dedup=dedup_mode):
+    """
+    Produces one memo per job from a single process.
+
+    Every job checks out agents for its audience and memo type from the registry, reusing those built for
+    earlier jobs of the same profile, and gets its own run directory named `<batch_id>-<job number>`,
+    so running a batch again with the same id resumes its unfinished jobs.
+    Jobs run concurrently and share one gateway that caps the LLM requests in flight across all of them.
+
+    Args:
+        jobs (list): Dicts with "topic", "audience" and "memo_type" keys.
+        events (EventStream): Stream the events of every job are emitted to, told apart by their run id.
+        dedup (str): Near-duplicate check of every job's sections: "flag", "strip" or "off".
+
+    Returns:
+        list: One result per job, in job order, with its run id and docx path or error.
+    """
+    batch_id = batch_id or new_run_id()
+    gateway = LLMGateway(max_inflight_requests)
+
+    def run_job(number, job):
+        producer = AutoMemoProduction(
+            topic=job["topic"],
+            audience=job["audience"],
+            memo_type=job["memo_type"],
+            max_concurrency=max_concurrency,
+            cache=cache,
+            run_id=f"{batch_id}-{number:04d}",
+            runs_directory=runs_directory,
+            agent_profile=(job["audience"], job["memo_type"]),
+            gateway=gateway,
+            docx_path=None,
+            export_spans=export_spans,
+            events=events,
+            dedup=dedup,
+        )
+        return producer.run_id, producer.run()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, max_jobs)) as executor:
+        futures = [executor.submit(run_job, number, job) for number, job in enumerate(jobs, start=1)]
+        for number, future in enumerate(futures, start=1):
+            try:
+                run_id, docx_path = future.result()
+                results.append({"job": number, "run_id": run_id, "docx": docx_path})
+                logging.info(f"Batch {batch_id}: job {number}/{len(jobs)} saved at {docx_path}")
+            except Exception as e:
+                results.append({"job": number, "run_id": f"{batch_id}-{number:04d}", "error": str(e)})
+                logging.error(f"Batch {batch_id}: job {number}/{len(jobs)} failed: {e}")
+    return results
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Produce a memo as a .docx file with a team of writer and reviewer agents.")
+    parser.add_argument("--cache", choices=CACHE_MODES, default=llm_cache_mode, help="LLM response cache mode (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=max_concurrent_sections, help="number of sections written in parallel (default: %(default)s)")
+    parser.add_argument("--trace", action="store_true", default=export_trace_spans, help="also export every timing span of the run to spans.jsonl in the run directory")
+    parser.add_argument("--resume", metavar="RUN_ID", help="resume an interrupted run, skipping the steps it already completed")
+    parser.add_argument("--from-run", metavar="RUN_ID", help="reuse the outline and sections of an earlier run whose inputs did not change, writing only the others")
+    parser.add_argument("--outline", metavar="MARKDOWN_FILE", help="write the memo from this outline instead of creating one, such as an edited outline.md of an earlier run")
+    parser.add_argument("--batch", metavar="JOBS_JSONL", help="produce one memo per line of a JSONL file of {topic, audience, memo_type} jobs")
+    parser.add_argument("--batch-id", help="id of the batch, reuse it to resume the unfinished jobs of a batch")
+    parser.add_argument("--jobs", type=int, default=max_concurrent_jobs, help="number of batch jobs run in parallel (default: %(default)s)")
+    parser.add_argument("--max-inflight", type=int, default=max_inflight_llm_requests, help="maximum LLM requests in flight across a run or batch (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="print the memos that would be produced without building agents or calling the model")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, help=f"flag or strip paragraphs that nearly duplicate another section's (default: {dedup_mode}, or the mode a resumed run was started with)")
+    parser.add_argument("--events", action="store_true", help="write progress events and the writer's streamed tokens to stdout as JSON lines, and everything else to stderr")
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
-    topic, audience, memo_type = get_user_inputs()
-    producer = AutoMemoProduction(topic=topic, audience=audience, memo_type=memo_type)
+    if args.dry_run:
+        # Only checks the inputs: no agents, memo database, cache or model calls
+        if args.batch:
+            plan = [{"job": number, **job} for number, job in enumerate(read_jobs_from_jsonl(args.batch), start=1)]
+        elif args.resume:
+            manifest = RunManifest.load(os.path.join(runs_directory, args.resume))
+            states = [section["state"] for section in manifest.data["sections"]]
+            plan = [{**{key: manifest.data[key] for key in ("run_id", "topic", "audience", "memo_type")}, "sections": {state: states.count(state) for state in set(states)}}]
+        else:
+            topic, audience, memo_type = get_user_inputs()
+            plan = [{"topic": topic, "audience": audience, "memo_type": memo_type, "from_run": args.from_run, "outline": args.outline}]
+            if args.from_run:
+                RunManifest.load(os.path.join(runs_directory, args.from_run))
+        for item in plan:
+            print(json.dumps(item))
+        sys.exit(0)
+
+    events = None
+    if args.events:
+        events = EventStream()
+        events.subscribe(ndjson_writer(sys.stdout))
+        # stdout only carries the events, the agents' messages and the run summary go to stderr
+        sys.stdout = sys.stderr
+
+    cache = open_response_cache(args.cache, llm_cache_path, max_entries=llm_cache_max_entries, ttl_seconds=llm_cache_ttl_seconds)
+    if args.batch:
+        results = run_batch(
+            read_jobs_from_jsonl(args.batch),
+            batch_id=args.batch_id,
+            max_jobs=args.jobs,
+            max_inflight_requests=args.max_inflight,
+            cache=cache,
+            max_concurrency=args.concurrency,
+            export_spans=args.trace,
+            events=events,
+            dedup=args.dedup or dedup_mode,
+        )
+        for result in results:
+            print(json.dumps(result))
+        sys.exit(1 if any("error" in result for result in results) else 0)
+
+    if args.resume:
+        producer = AutoMemoProduction.resume(args.resume, max_concurrency=args.concurrency, cache=cache, gateway=LLMGateway(args.max_inflight), export_spans=args.trace, events=events, **({"dedup": args.dedup} if args.dedup else {}))
+    else:
+        topic, audience, memo_type = get_user_inputs()
+        producer = AutoMemoProduction(topic=topic, audience=audience, memo_type=memo_type, max_concurrency=args.concurrency, cache=cache, gateway=LLMGateway(args.max_inflight), export_spans=args.trace, base_run=args.from_run, events=events, dedup=args.dedup or dedup_mode)
+        if args.outline:
+            with open(args.outline, "r", encoding="utf-8") as file:
+                producer.manifest.set_outline(file.read())
     producer.run()
-
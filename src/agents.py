@@ -0,0 +1,246 @@
+# ./src/agents.py
+
+from autogen import AssistantAgent, ConversableAgent, GroupChat, GroupChatManager
+from autogen.agentchat.contrib.capabilities.teachability import Teachability
+from src.config import parallel_reviews, teachability_max_retrievals, teachability_recall_threshold, section_history_messages, compact_nested_chats
+from src.routing import llm_config_for
+from src.reviews import SCORE_INSTRUCTION, parse_score, parallel_summary_from_nested_chats, structured_review_summary
+from contextlib import nullcontext
+
+# -------- Outliner
+
+def create_outliner(messages):
+    return AssistantAgent(
+        name="Outliner",
+        system_message=messages["outliner_system_message"],
+        llm_config=llm_config_for("outliner"),
+    )
+
+# -------- Section team
+
+class PersistentTeachability(Teachability):
+    """Teachability that recalls and stores memos in a shared PersistentMemoStore instead of a memo DB of its own."""
+
+    def __init__(self, memo_store, verbosity=0, recall_threshold=1.5, max_num_retrievals=10, llm_config=None):
+        self.verbosity = verbosity
+        self.path_to_db_dir = memo_store.path_to_db_dir
+        self.recall_threshold = recall_threshold
+        self.max_num_retrievals = max_num_retrievals
+        self.llm_config = llm_config
+        self.analyzer = None
+        self.teachable_agent = None
+        self.memo_store = memo_store
+
+
+def create_teachability(memo_store):
+    return PersistentTeachability(
+        memo_store,
+        verbosity=0,
+        recall_threshold=teachability_recall_threshold,
+        llm_config=llm_config_for("analyzer"),
+        max_num_retrievals=teachability_max_retrievals,
+    )
+
+def forget(agent, partner):
+    """Drops everything an agent keeps about a conversation partner, such as the manager of a finished group chat."""
+    for state in (agent._oai_messages, agent._consecutive_auto_reply_counter, agent._max_consecutive_auto_reply_dict, agent.reply_at_receive):
+        state.pop(partner, None)
+
+def trim_history(agent, keep_messages):
+    """Keeps the last `keep_messages` messages of each of an agent's conversations."""
+    for messages in agent.chat_messages.values():
+        del messages[:max(0, len(messages) - keep_messages)]
+
+def reflection_message(recipient, messages, sender, config):
+    return f'''Review the following content. \n\n {recipient.chat_messages_for_summary(sender)[-1]['content']}'''
+
+class SectionTeam:
+    """The writer, critic and reviewers that work together on one section at a time.
+
+    Agents keep their chat histories per conversation, so every concurrent section worker needs its own team.
+    """
+    def __init__(self, messages, teachability):
+        self.teachability = teachability
+        self.report = None
+        self._manager = None
+
+        # -------- Writer
+
+        self.writer = AssistantAgent(
+            name="Writer",
+            system_message=messages["writer_system_message"],
+            llm_config=llm_config_for("writer"),
+        )
+
+        # -------- Reviewers
+
+        self.critic = AssistantAgent(
+            name="Critic",
+            is_termination_msg=lambda x: x.get("content", "").find("TERMINATE") >= 0,
+            llm_config=llm_config_for("critic"),
+            system_message=messages["critic_system_message"],
+        )
+
+        self.layman_reviewer = AssistantAgent(
+            name="Layman Reviewer",
+            description="A reviewer that makes sure a laywoman would fully understand the content provided to her.",
+            llm_config=llm_config_for("reviewer"),
+            system_message=messages["layman_system_message"],
+        )
+
+        self.financial_reviewer = AssistantAgent(
+            name="Financial Reviewer",
+            description='A reviewer that makes sure financial justification are credible',
+            llm_config=llm_config_for("reviewer"),
+            system_message=messages["financial_reviewer_system_message"],
+        )
+
+        self.quality_reviewer = AssistantAgent(
+            name="Quality Assurance Reviewer",
+            description="a reviewer that makes sure that claims are well justified",
+            llm_config=llm_config_for("reviewer"),
+            system_message=messages["quality_system_message"],
+        )
+
+        self.meta_reviewer = AssistantAgent(
+            name="Meta Reviewer",
+            llm_config=llm_config_for("meta_reviewer"),
+            system_message="You are a meta reviewer, you aggragate and review "
+            "the work of other reviewers and give a final suggestion on the content.",
+        )
+
+        # -------- Scorer of the quality gate, outside of the group chat and without Teachability
+
+        self.scorer = AssistantAgent(
+            name="Scorer",
+            llm_config=llm_config_for("scorer"),
+            system_message=messages["scorer_system_message"],
+        )
+
+        # autogen's initiate_chat swaps its sender's response cache without a lock, so the reviews that run in
+        # parallel each get a sender of their own instead of sharing the critic. They never call the LLM
+        self.review_senders = [ConversableAgent(name="Critic", llm_config=False, human_input_mode="NEVER") for _ in range(3)]
+
+        self.review_chats = [
+            {"recipient": reviewer, "sender": sender, "message": reflection_message,
+             "summary_method": structured_review_summary,
+             "max_turns": 1}
+            for reviewer, sender in zip((self.layman_reviewer, self.financial_reviewer, self.quality_reviewer), self.review_senders)
+        ] + [
+             {"recipient": self.meta_reviewer,
+              "message": "Aggregrate feedback from all reviewers and give final suggestions on the writing. NEVER suggest to improve the memo section based on additional sections or more information that would be contained in other different sections.  Make sure your suggestion is concise (within 3 bullet points), concrete and to the point.  ALWAYS offer suggestion that supports the deduplication of the writer's content for the current and future sections based on the previous sections.",
+             "max_turns": 1},
+        ]
+
+        self.critic.register_nested_chats(
+            self.review_chats,
+            trigger=self.writer,
+            reply_func_from_nested_chats=self.review,
+        )
+        # Now add teachability to the agent.
+        teachability.add_to_agent(self.critic)
+        teachability.add_to_agent(self.meta_reviewer)
+        # teachability.add_to_agent(self.writer)
+
+    @property
+    def agents(self):
+        return [self.writer, self.critic, self.layman_reviewer, self.financial_reviewer, self.quality_reviewer, self.meta_reviewer]
+
+    @property
+    def members(self):
+        """The agents, the scorer, the review senders and the Teachability analyzer, which all keep chat histories."""
+        analyzer = self.teachability.analyzer
+        return self.agents + [self.scorer] + self.review_senders + ([analyzer] if analyzer is not None else [])
+
+    def history_size(self):
+        """Returns the number of messages and characters in the chat histories of the team."""
+        histories = [messages for agent in self.members for messages in agent.chat_messages.values()]
+        return sum(len(messages) for messages in histories), sum(len(str(message.get("content") or "")) for messages in histories for message in messages)
+
+    def end_section(self, manager=None, keep_messages=section_history_messages, compact=compact_nested_chats):
+        """
+        Scopes the team's state to the section it just wrote, so long memos and batches do not grow it.
+
+        The section's group chat is emptied and every agent forgets its manager, which the next section reuses. The other
+        conversations are trimmed to their last `keep_messages` messages (None keeps them all), after the
+        reviewers' transcripts are compacted to their review summaries when `compact` is set.
+        """
+        if manager is not None:
+            manager.groupchat.messages.clear()
+            manager.clear_history()
+            for agent in self.members:
+                forget(agent, manager)
+        if keep_messages is None:
+            return
+        if compact and keep_messages:
+            self.compact_reviews()
+        for agent in self.members:
+            trim_history(agent, keep_messages)
+
+    def compact_reviews(self):
+        """Replaces the transcript of every reviewer chat, which holds the whole section, with the review summary."""
+        for chat in self.review_chats:
+            reviewer, sender = chat["recipient"], chat.get("sender") or self.critic
+            if not sender.chat_messages.get(reviewer):
+                continue
+            summary = structured_review_summary(sender, reviewer, {})
+            sender.chat_messages[reviewer][:] = [{"content": summary, "role": "user", "name": reviewer.name}]
+            reviewer.chat_messages[sender][:] = [{"content": summary, "role": "assistant"}]
+
+    def review(self, chat_queue, recipient, messages, sender, config):
+        """Runs the nested reviewer chats, timed as a stage of the team's run report."""
+        reply_func = parallel_summary_from_nested_chats if parallel_reviews else self.critic._summary_from_nested_chats
+        with self.report.stage("reviews") if self.report is not None else nullcontext():
+            return reply_func(chat_queue, recipient, messages, sender, config)
+
+    def score_section(self, markdown_string):
+        """Scores a section out of 10 with one call of the scorer, returning None when it gave no score."""
+        reply = self.scorer.generate_reply(messages=[{"content": f"{SCORE_INSTRUCTION}\n\n{markdown_string}", "role": "user"}])
+        if isinstance(reply, dict):
+            reply = reply.get("content")
+        return parse_score(reply)
+
+    def review_section(self, markdown_string, cache=None):
+        """Has the reviewers review a section outside of a group chat and returns the meta reviewer's answer."""
+        # The critic answers the writer with the nested reviewer chats, ending with the meta review
+        result = self.writer.initiate_chat(self.critic, message=markdown_string, max_turns=1, cache=cache, silent=True)
+        return result.summary or ""
+
+    def use_cache(self, cache):
+        """Routes every LLM call of the team, including the nested reviews and Teachability analysis, through `cache`."""
+        for agent in self.agents + [self.scorer]:
+            agent.client_cache = cache
+        # initiate_chat replaces the agents' cache for the duration of a chat, so nested chats need it explicitly
+        for chat in self.review_chats:
+            chat["cache"] = cache
+        if self.teachability.analyzer is not None:
+            self.teachability.analyzer.client_cache = cache
+
+    def select_speaker(self, last_speaker, groupchat):
+        messages = groupchat.messages
+        if len(messages) <= 1:
+            return self.writer
+        if last_speaker is self.writer:
+            return self.critic
+        if last_speaker in [self.layman_reviewer, self.financial_reviewer, self.quality_reviewer, self.meta_reviewer]:
+            return self.critic if last_speaker != self.meta_reviewer else self.writer
+        if last_speaker is self.critic:
+            return "random" if len(messages) < 3 else self.meta_reviewer
+        else:
+            return "random"
+
+    def group_chat_manager(self):
+        """
+        Returns the manager of the team's writer/reviewer group chat, with an empty chat for the next section.
+        It is built once per team, `end_section` clears it after every section.
+        """
+        if self._manager is None:
+            groupchat = GroupChat(
+                agents=self.agents,
+                messages=[],
+                max_round=2,
+                speaker_selection_method=self.select_speaker,
+            )
+            self._manager = GroupChatManager(groupchat=groupchat, llm_config=llm_config_for("chat_manager"))
+        self._manager.groupchat.messages.clear()
+        return self._manager
@@ -1,6 +1,4 @@
 # ./src/config.py
-from autogen import config_list_from_json
-from autogen.cache import Cache
 import os
 
 
@@ -8,10 +6,17 @@ llm_config = {"model": "gpt-4o",
               "api_key": "your_api_key_here", 
               "max_tokens": 4000 , # change this according to your needs
               "temperature": 0.7, #change this according to your needs
+              "cache_seed": None, # responses are cached by the memogen LLM cache below instead
+              "max_retries": 0, # failed calls are retried by the gateway's scheduler instead of the OpenAI client
     }
 
+# Spread the calls over several keys or endpoints by listing them in a config list, e.g.
+# llm_config = {"config_list": [{"model": "gpt-4o", "api_key": "first_key"}, {"model": "gpt-4o", "api_key": "second_key"}],
+#               "max_tokens": 4000, "temperature": 0.7, "cache_seed": None, "max_retries": 0}
+
 
 filter_criteria = {"model": ["gptonic"]}
+
 ### AZURE 
 # llm_config =     {
 #         "model": "your_deployment_name_here", # mine is "tonicgpt"
@@ -22,3 +27,123 @@ filter_criteria = {"model": ["gptonic"]}
 #         "max_tokens": 1800 ,# change this according to your needs
 #         "temperature": 0.7, #change this according to your needs
 #    }
+
+# Model tiers, each an llm_config. List several keys of a tier's model in a config list to spread the calls over them
+model_tiers = {
+    "strong": llm_config,
+    "fast": {**llm_config, "model": "gpt-4o-mini"},
+}
+# Tiers a tier falls back to, in order, when its calls keep failing or time out (set "timeout" in a tier to bound slow calls)
+model_fallbacks = {
+    "strong": ["fast"],
+    "fast": ["strong"],
+}
+# Tier, max_tokens and temperature of every agent role; roles not listed use the default route.
+# Roles with "stream" receive their responses as they are generated, which the run's event stream forwards
+agent_routes = {
+    "default": {"tier": "strong", "max_tokens": 4000, "temperature": 0.7},
+    "outliner": {"tier": "strong", "max_tokens": 4000, "temperature": 0.7},
+    "writer": {"tier": "strong", "max_tokens": 4000, "temperature": 0.7, "stream": True},
+    "critic": {"tier": "fast", "max_tokens": 1500, "temperature": 0.3},
+    "reviewer": {"tier": "fast", "max_tokens": 1000, "temperature": 0.3},
+    "meta_reviewer": {"tier": "fast", "max_tokens": 1000, "temperature": 0.3},
+    "scorer": {"tier": "fast", "max_tokens": 20, "temperature": 0.0},
+    "chat_manager": {"tier": "fast", "max_tokens": 200, "temperature": 0.0},
+    "analyzer": {"tier": "fast", "max_tokens": 500, "temperature": 0.0},
+}
+
+# Number of sections written at the same time. 1 keeps the sequential two-pass behaviour,
+# higher values draft sections in parallel against the outline and pipeline the refinement pass.
+max_concurrent_sections = 1
+
+# Sections are work units of the outline: a heading is written together with its sub-headings when they fit in
+# outline_unit_max_tokens outline tokens, and smaller neighbouring units are merged up to outline_unit_min_tokens.
+# None for outline_unit_max_tokens writes every heading of the outline as its own section.
+outline_unit_min_tokens = 150
+outline_unit_max_tokens = 600
+
+# Token budget for the writer prompt of a section. The nearest sections are included in full and more
+# distant ones as summaries or headings. None includes the full text of every other section.
+section_context_token_budget = 6000
+
+# Run the layman, financial and quality reviews of a section at the same time before the meta reviewer
+parallel_reviews = True
+
+# Messages of every agent conversation kept once a section is written: 0 starts every section from empty
+# histories, None keeps them all, so histories and memory grow with every section
+section_history_messages = 0
+# When messages are kept, the reviewers' transcripts are first replaced by their review summaries
+compact_nested_chats = True
+
+# Quality gate of the second pass: a fast-tier scorer rates every draft out of 10 in one call. Sections scoring at
+# least the threshold are kept as drafted; only the others get the full review and are refined with the meta
+# reviewer's feedback, then scored again, up to max_refinement_rounds refinements. None refines every section once
+# without scoring it.
+review_score_threshold = 8
+max_refinement_rounds = 2
+
+# Near-duplicate paragraphs between sections are found locally, without LLM calls, every time a section is written:
+# paragraphs and list items are MinHashed over their word shingles and compared within locality-sensitive hash bands.
+# "flag" reports them and has the quality gate send the later section's repeated passages back to its writer,
+# "strip" removes them from the later section as soon as it is written, "off" skips the check.
+dedup_mode = "flag"
+dedup_threshold = 0.5 # estimated Jaccard similarity of two paragraphs' shingles from which they are near-duplicates
+dedup_shingle_words = 5
+dedup_min_words = 12 # shorter passages, such as headings and one-line bullets, are not compared
+dedup_permutations = 64 # MinHash values per paragraph, split into dedup_bands bands
+dedup_bands = 32
+
+# Teachability memos are kept across runs in a local Chroma database, in one namespace per memo type
+teachability_db_path = "./tmp/teachable_agent_db"
+reset_teachability_db = False # True clears a memo type's memos the first time it is used in a process
+teachability_max_memos = 2000 # least recently recalled memos of a memo type are evicted beyond this size
+teachability_max_retrievals = 10 # memos looked up for every message the critic and meta reviewer receive
+teachability_recall_threshold = 3
+embedding_cache_size = 2048 # embeddings of recently seen reviewer text kept in memory
+
+# Processes converting the sections of large memos to docx, None uses every CPU
+docx_max_workers = None
+
+# Every memo run keeps its outline, sections, checkpoint manifest and docx in a directory named after its run id
+runs_directory = "./src/result/runs"
+
+# Every run writes report.json with time and tokens per stage and agent. Set to True to also export
+# every timing span, OpenTelemetry style, to spans.jsonl
+export_trace_spans = False
+
+# Batch mode: memos produced in parallel, and LLM requests in flight across all of them
+max_concurrent_jobs = 4
+max_inflight_llm_requests = 8
+
+# Rate limits of every key or endpoint, set them to those of your account. None disables a limit
+llm_requests_per_minute = 500
+llm_tokens_per_minute = 30000
+llm_max_retries = 5 # retries of a throttled or failed call, with jittered exponential backoff
+llm_priority_agents = ["Outliner", "Writer"] # agents whose calls go ahead of the reviewers' when calls queue up
+
+# Connection pool of the HTTP client every agent's OpenAI client shares. HTTP/2 is used when the h2 package is installed
+llm_http2 = True
+llm_http_max_connections = 100
+llm_http_max_keepalive_connections = 20
+llm_http_keepalive_expiry = 30.0 # seconds an idle connection is kept open for the next call
+
+# LLM response cache: "off", "read-only" or "read-write"
+llm_cache_mode = "read-write"
+llm_cache_path = "./.cache/memogen_llm_cache.sqlite"
+llm_cache_max_entries = 10000 # least recently used responses are evicted beyond this size
+llm_cache_ttl_seconds = 30 * 24 * 3600 # responses older than this are evicted, None keeps them forever
+
+# Offline backend that answers every LLM call with generated markdown, see src/mock_llm.py.
+# Used by the benchmarks, and instead of llm_config when the MEMOGEN_MOCK_LLM environment variable is set.
+mock_llm_config = {"model": "mock-gpt-4o",
+                   "model_client_cls": "MockModelClient",
+                   "mock_latency": 0.0, # seconds per call
+                   "mock_completion_tokens": 300,
+                   "mock_outline_sections": 8,
+                   "cache_seed": None,
+    }
+
+if os.environ.get("MEMOGEN_MOCK_LLM"):
+    llm_config = mock_llm_config
+    model_tiers = {"strong": mock_llm_config, "fast": mock_llm_config}
+    llm_requests_per_minute = llm_tokens_per_minute = None
@@ -0,0 +1,143 @@
+# ./src/context.py
+
+from typing import Dict, List, NamedTuple, Tuple
+import functools
+import logging
+import re
+import threading
+
+HEADING_PATTERN = re.compile(r'^#+\s+(.*)$', re.MULTILINE)
+_encoding_lock = threading.Lock()
+
+
+class SectionContext(NamedTuple):
+    """The three levels of detail a neighbouring section can be shown at, with their token counts once counted."""
+    text: str
+    summary: str
+    heading: str
+    # (text, summary, heading) tokens by model; the SectionStore caches a context until its section changes
+    token_counts: Dict[str, Tuple[int, int, int]]
+
+    def tokens(self, model: str = "gpt-4o") -> Tuple[int, int, int]:
+        """Returns the tokens of the text, summary and heading, counting them on first use for a model."""
+        counts = self.token_counts.get(model)
+        if counts is None:
+            counts = self.token_counts[model] = (count_tokens(self.text, model), count_tokens(self.summary, model), count_tokens(self.heading, model))
+        return counts
+
+
+def _encoding(model: str):
+    # Concurrent section workers must not all try to load the vocabulary at once
+    with _encoding_lock:
+        return _load_encoding(model)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabularies on first use, which fails offline
+        logging.warning(f"tiktoken unavailable, approximating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Counts the tokens of `text` with tiktoken, or approximates them at four characters per token."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def markdown_heading(markdown_string: str) -> str:
+    """Returns the first heading of a markdown section, or its first non-empty line."""
+    match = HEADING_PATTERN.search(markdown_string)
+    if match:
+        return match.group(1).strip()
+    for line in markdown_string.splitlines():
+        if line.strip():
+            return line.strip()
+    return ""
+
+
+def summarize_markdown(markdown_string: str, max_words: int = 60) -> str:
+    """Returns a one-paragraph summary of a markdown section: its heading and the start of its first paragraph."""
+    heading = markdown_heading(markdown_string)
+    body = HEADING_PATTERN.sub('', markdown_string)
+    paragraph = next((p for p in re.split(r'\n\s*\n', body) if p.strip()), "")
+    words = re.sub(r'[*_`>#|-]+', ' ', paragraph).split()
+    summary = " ".join(words[:max_words])
+    if len(words) > max_words:
+        summary += " ..."
+    return f"{heading}: {summary}" if summary else heading
+
+
+def section_context(markdown_string: str, text: str) -> SectionContext:
+    """Builds the context views of a section from its markdown and plain text."""
+    return SectionContext(text=text, summary=summarize_markdown(markdown_string), heading=markdown_heading(markdown_string), token_counts={})
+
+
+def budget_neighbour_context(previous: List[SectionContext], following: List[SectionContext], budget: int, model: str = "gpt-4o") -> Tuple[str, str]:
+    """
+    Fits the sections around the focus section into a token budget.
+
+    Every neighbour starts at its heading. Then, nearest neighbours first, each one is upgraded to its full
+    text, or to its summary when the full text does not fit anymore, until the budget is spent. Token counts
+    come from the contexts' cache, so a section is only counted once per version.
+
+    Args:
+        previous (list): The sections before the focus section, in document order.
+        following (list): The sections after the focus section, in document order.
+        budget (int): The number of tokens available for the neighbour context.
+        model (str): The model whose tokenizer is used for counting.
+
+    Returns:
+        tuple: The previous and next context, as strings.
+    """
+    # Nearest first: the section just before, the one just after, then two before, two after...
+    neighbours = []
+    for distance in range(1, max(len(previous), len(following)) + 1):
+        if distance <= len(previous):
+            neighbours.append(("previous", len(previous) - distance))
+        if distance <= len(following):
+            neighbours.append(("next", distance - 1))
+    sections = {"previous": previous, "next": following}
+    chosen = {}
+    cost = {}
+    remaining = budget
+    counts = {key: sections[key[0]][key[1]].tokens(model) for key in neighbours}
+    for key in neighbours:
+        tokens = counts[key][2]
+        if tokens <= remaining:
+            chosen[key], cost[key] = sections[key[0]][key[1]].heading, tokens
+            remaining -= tokens
+
+    # Cheapest upgrade among the neighbours from each one on, to stop once none of them fits anymore
+    cheapest = [0] * len(neighbours)
+    lowest = float("inf")
+    for number in range(len(neighbours) - 1, -1, -1):
+        key = neighbours[number]
+        lowest = min(lowest, min(counts[key][:2]) - cost.get(key, 0))
+        cheapest[number] = lowest
+    for number, key in enumerate(neighbours):
+        if cheapest[number] > remaining:
+            break
+        section = sections[key[0]][key[1]]
+        freed = cost.get(key, 0)
+        for candidate, tokens in ((section.text, counts[key][0]), (section.summary, counts[key][1])):
+            if tokens - freed <= remaining:
+                chosen[key], cost[key] = candidate, tokens
+                remaining -= tokens - freed
+                break
+
+    previous_content = "\n\n".join(chosen[("previous", i)] for i in range(len(previous)) if ("previous", i) in chosen)
+    next_content = "\n\n".join(chosen[("next", i)] for i in range(len(following)) if ("next", i) in chosen)
+    return previous_content, next_content
@@ -0,0 +1,198 @@
+# ./src/dedup.py
+
+from src.config import dedup_threshold, dedup_shingle_words, dedup_min_words, dedup_permutations, dedup_bands
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import functools
+import re
+import threading
+import zlib
+
+# What is done with the near-duplicate paragraphs found after a section is written
+DEDUP_MODES = ("flag", "strip", "off")
+HEADING_LINE = re.compile(r'^\s*#+\s')
+LIST_ITEM = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Mersenne prime of the hash family; below 2**32 so that a * hash + b stays within 64 bits
+_PRIME = (1 << 31) - 1
+
+
+class Paragraph(NamedTuple):
+    """A passage of a section as it appears in its markdown, with its MinHash signature."""
+    text: str
+    signature: Tuple[int, ...]
+
+
+class Overlap(NamedTuple):
+    """A paragraph of a section that nearly duplicates a paragraph of another section."""
+    section: str
+    paragraph: str
+    other_section: str
+    other_paragraph: str
+    score: float
+
+
+def _passages(markdown_string: str):
+    """
+    Yields every line group of a section as (passage text or None, lines). Paragraphs and list items are
+    passages; headings, tables and blank lines are not, so joining every group's lines gives the section back.
+    """
+    for number, block in enumerate(re.split(r'\n\s*\n', markdown_string)):
+        if number:
+            yield None, [""]
+        item: List[str] = []
+        for line in block.splitlines():
+            if not line.strip() or HEADING_LINE.match(line) or line.lstrip().startswith("|"):
+                if item:
+                    yield " ".join(part.strip() for part in item), item
+                    item = []
+                yield None, [line]
+            elif LIST_ITEM.match(line) and item:
+                yield " ".join(part.strip() for part in item), item
+                item = [line]
+            else:
+                item.append(line)
+        if item:
+            yield " ".join(part.strip() for part in item), item
+
+
+def paragraphs(markdown_string: str, min_words: int = dedup_min_words) -> List[str]:
+    """
+    Splits a markdown section into the passages it is compared by: its paragraphs and list items.
+    Headings, tables and passages of fewer than `min_words` words are left out.
+    """
+    return [text for text, _ in _passages(markdown_string) if text is not None and len(words(text)) >= min_words]
+
+
+def words(text: str) -> List[str]:
+    """Lowercase words of a passage, without markdown punctuation."""
+    return WORD.findall(text.lower())
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_family(permutations: int, seed: int = 1):
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, _PRIME, size=permutations).astype(np.uint64)
+    b = rng.randint(0, _PRIME, size=permutations).astype(np.uint64)
+    return a, b
+
+
+def signature(text: str, shingle_words: int = dedup_shingle_words, permutations: int = dedup_permutations) -> Tuple[int, ...]:
+    """MinHash signature of the word shingles of a passage; the share of equal values estimates their Jaccard similarity."""
+    import numpy as np
+
+    tokens = words(text)
+    size = min(shingle_words, len(tokens)) or 1
+    shingles = {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) & _PRIME for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _hash_family(permutations)
+    return tuple(int(value) for value in ((np.outer(hashes, a) + b) % _PRIME).min(axis=0))
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+class DuplicateIndex:
+    """
+    Finds near-duplicate paragraphs between the sections of a memo without any LLM call.
+
+    Every paragraph and list item of a section is MinHashed over its word shingles and filed in
+    locality-sensitive hash bands, so only paragraphs that share a band are compared. A section is
+    re-indexed whenever it is replaced, and its overlaps are the paragraphs whose estimated Jaccard
+    similarity with a paragraph of another section reaches the threshold.
+    """
+
+    def __init__(self, threshold: float = dedup_threshold, shingle_words: int = dedup_shingle_words, min_words: int = dedup_min_words, permutations: int = dedup_permutations, bands: int = dedup_bands):
+        if permutations % bands:
+            raise ValueError(f"{permutations} permutations cannot be split into {bands} bands")
+        self.threshold = threshold
+        self.shingle_words = shingle_words
+        self.min_words = min_words
+        self.permutations = permutations
+        self.bands = bands
+        self._rows = permutations // bands
+        self._paragraphs: Dict[str, List[Paragraph]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], set] = {}
+        self._lock = threading.Lock()
+
+    def _keys(self, paragraph: Paragraph):
+        for band in range(self.bands):
+            yield band, paragraph.signature[band * self._rows:(band + 1) * self._rows]
+
+    def update(self, section: str, markdown_string: str) -> None:
+        """Indexes the paragraphs of a section, replacing its earlier version."""
+        indexed = [
+            Paragraph(text, signature(text, self.shingle_words, self.permutations))
+            for text in paragraphs(markdown_string, self.min_words)
+        ]
+        with self._lock:
+            self._remove(section)
+            self._paragraphs[section] = indexed
+            for position, paragraph in enumerate(indexed):
+                for key in self._keys(paragraph):
+                    self._buckets.setdefault(key, set()).add((section, position))
+
+    def _remove(self, section: str) -> None:
+        for position, paragraph in enumerate(self._paragraphs.pop(section, [])):
+            for key in self._keys(paragraph):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard((section, position))
+                    if not bucket:
+                        del self._buckets[key]
+
+    def remove(self, section: str) -> None:
+        with self._lock:
+            self._remove(section)
+
+    def overlaps(self, section: str) -> List[Overlap]:
+        """Returns the paragraphs of a section that nearly duplicate another section's, each with its closest match."""
+        found = []
+        with self._lock:
+            for paragraph in self._paragraphs.get(section, []):
+                best: Optional[Overlap] = None
+                candidates = set()
+                for key in self._keys(paragraph):
+                    candidates.update(self._buckets.get(key, ()))
+                for other_section, position in sorted(candidates):
+                    if other_section == section:
+                        continue
+                    other = self._paragraphs[other_section][position]
+                    score = similarity(paragraph.signature, other.signature)
+                    if score >= self.threshold and (best is None or score > best.score):
+                        best = Overlap(section, paragraph.text, other_section, other.text, score)
+                if best is not None:
+                    found.append(best)
+        return found
+
+    def paragraph_count(self, section: str) -> int:
+        with self._lock:
+            return len(self._paragraphs.get(section, []))
+
+    def scores(self) -> Dict[str, Dict[str, float]]:
+        """Overlap of every indexed section: its paragraphs, those duplicated elsewhere, their share and the highest similarity."""
+        with self._lock:
+            sections = list(self._paragraphs)
+        report = {}
+        for section in sections:
+            overlaps = self.overlaps(section)
+            count = self.paragraph_count(section)
+            report[section] = {
+                "paragraphs": count,
+                "duplicates": len(overlaps),
+                "overlap": round(len(overlaps) / count, 3) if count else 0.0,
+                "max_score": round(max((overlap.score for overlap in overlaps), default=0.0), 3),
+            }
+        return report
+
+
+def strip_paragraphs(markdown_string: str, passages: List[str]) -> str:
+    """Removes the given passages, as returned by `paragraphs`, from a section's markdown."""
+    remove = set(passages)
+    lines = []
+    for text, group in _passages(markdown_string):
+        if text is None or text not in remove:
+            lines.extend(group)
+    return re.sub(r'\n{3,}', '\n\n', "\n".join(lines)).strip() + "\n"
@@ -0,0 +1,153 @@
+# ./src/events.py
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, TextIO
+import asyncio
+import json
+import sys
+import threading
+import time
+
+# Terminal colour codes autogen prints around a streamed response
+ANSI_CODES = ("\033[32m", "\033[0m")
+
+
+class EventIterator:
+    """Async iterator over the events of an EventStream from the moment it was created, until it is closed."""
+
+    def __init__(self, stream: "EventStream"):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._stream = stream
+        stream._add_iterator(self)
+
+    def _put(self, event: Optional[Dict[str, Any]]) -> None:
+        # Events are emitted from worker threads
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def close(self) -> None:
+        self._put(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        event = await self._queue.get()
+        if event is None:
+            self._stream._remove_iterator(self)
+            raise StopAsyncIteration
+        return event
+
+
+class EventStream:
+    """
+    Progress events of a memo run, as they happen.
+
+    Every event is a dict with its "type", the "run_id" and the unix "time", plus the fields of its type:
+
+        run_started: topic, audience, memo_type
+        outline_created: outline
+        section_started: section, refinement (0 for the first draft)
+        token: section, delta, streamed by the writer while it writes a section
+        section_checked: section, paragraphs, duplicates (paragraph, other_section, score of each), stripped
+        section_drafted: section, markdown
+        section_reviewed: section, score, threshold, accepted, repeated (passages of earlier sections it repeats)
+        section_refined: section, refinement, markdown
+        docx_written: path
+        run_finished: docx
+        run_failed: error
+
+    Consumers subscribe a callback, which is called on the thread that emits the event, or iterate over the
+    events with `async for`. Several runs can share a stream; their events are told apart by run id.
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id
+        self._callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self._iterators: List[EventIterator] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """Calls `callback` with every event from now on; returns a function that unsubscribes it."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+        return unsubscribe
+
+    def __aiter__(self) -> EventIterator:
+        return EventIterator(self)
+
+    def _add_iterator(self, iterator: EventIterator) -> None:
+        with self._lock:
+            self._iterators.append(iterator)
+
+    def _remove_iterator(self, iterator: EventIterator) -> None:
+        with self._lock:
+            if iterator in self._iterators:
+                self._iterators.remove(iterator)
+
+    def emit(self, event_type: str, run_id: Optional[str] = None, **fields) -> None:
+        event = {"type": event_type, "run_id": run_id or self.run_id, "time": time.time(), **fields}
+        with self._lock:
+            callbacks = list(self._callbacks)
+            iterators = list(self._iterators)
+        for callback in callbacks:
+            callback(event)
+        for iterator in iterators:
+            iterator._put(event)
+
+    def close(self) -> None:
+        """Ends every async iteration over the stream."""
+        with self._lock:
+            iterators = list(self._iterators)
+        for iterator in iterators:
+            iterator.close()
+
+    @contextmanager
+    def stream_tokens(self, **fields):
+        """Emits what autogen streams to its IOStream on the calling thread as token events with `fields`."""
+        from autogen.io import IOStream
+
+        with IOStream.set_default(TokenIOStream(self, IOStream.get_default(), fields)):
+            yield
+
+
+class TokenIOStream:
+    """
+    autogen IOStream that turns the chunks of streamed responses into token events.
+    Every print still goes to the IOStream it wraps, so the console shows the responses as they stream.
+    """
+
+    def __init__(self, events: EventStream, output, fields: Dict[str, Any]):
+        self.events = events
+        self.output = output
+        self.fields = fields
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        self.output.print(*objects, sep=sep, end=end, flush=flush)
+        # autogen prints every chunk of a streamed response without a line end; its other output ends lines
+        text = sep.join(str(value) for value in objects)
+        if end == "" and text and text not in ANSI_CODES:
+            self.events.emit("token", delta=text, **self.fields)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self.output.input(prompt, password=password)
+
+
+def ndjson_writer(file: Optional[TextIO] = None) -> Callable[[Dict[str, Any]], None]:
+    """Returns an event callback that writes every event as a line of JSON to `file`, stdout by default."""
+    file = file or sys.stdout
+    lock = threading.Lock()
+
+    def write(event: Dict[str, Any]) -> None:
+        line = json.dumps(event, ensure_ascii=False)
+        with lock:
+            file.write(line + "\n")
+            file.flush()
+
+    return write
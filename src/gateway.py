@@ -0,0 +1,196 @@
+# ./src/gateway.py
+
+from src.context import count_tokens
+from src.mock_llm import MockModelClient
+from src.routing import agent_role
+from src.scheduler import RequestScheduler, endpoint_name, retry_delay
+from src.config import llm_requests_per_minute, llm_tokens_per_minute, llm_max_retries, llm_priority_agents
+from typing import Iterable, Optional
+import time
+
+# Custom model clients that llm_config entries can name in "model_client_cls"
+MODEL_CLIENTS = {"MockModelClient": MockModelClient}
+
+
+def register_model_clients(client, llm_config) -> None:
+    """Registers the custom model clients named in an llm_config on its client, which autogen leaves inactive until then."""
+    llm_config = llm_config or {}
+    for config in llm_config.get("config_list") or [llm_config]:
+        model_client_cls = MODEL_CLIENTS.get(config.get("model_client_cls"))
+        if model_client_cls is not None:
+            client.register_model_client(model_client_cls)
+
+
+def endpoint_key(config) -> str:
+    """Identifies an endpoint config; every config shares the same pooled HTTP client, which is left out."""
+    return repr(sorted((key, repr(value)) for key, value in config.items() if key != "http_client"))
+
+
+def endpoint_clients(agent, clients=None):
+    """
+    Returns (endpoint name, config, client) triples for every entry of an agent's llm_config, where config
+    is the entry with the llm_config's own settings. A config list of several keys or endpoints is split
+    into one client per entry, so the gateway picks the entry of every call instead of the client trying
+    them in order. Those clients are reused from `clients`, a dict by endpoint config, when given.
+    """
+    llm_config = agent.llm_config or {}
+    config_list = llm_config.get("config_list") or [llm_config]
+    base_config = {key: value for key, value in llm_config.items() if key != "config_list"}
+    if len(config_list) == 1:
+        register_model_clients(agent.client, llm_config)
+        return [(endpoint_name(config_list[0]), {**base_config, **config_list[0]}, agent.client)]
+    from autogen import OpenAIWrapper
+    endpoints = []
+    for config in config_list:
+        merged = {**base_config, **config}
+        key = endpoint_key(merged)
+        client = clients.get(key) if clients is not None else None
+        if client is None:
+            client = OpenAIWrapper(**base_config, config_list=[config])
+            register_model_clients(client, config)
+            if clients is not None:
+                # Another thread may have built the same client in the meantime, the first one is kept
+                client = clients.setdefault(key, client)
+        endpoints.append((endpoint_name(config), merged, client))
+    return endpoints
+
+
+def model_tiers(endpoints):
+    """Groups endpoint names by model, in the order the models first appear, which is the order they fall back in."""
+    tiers = {}
+    for name, config, _ in endpoints:
+        tiers.setdefault(config.get("model"), [])
+        if name not in tiers[config.get("model")]:
+            tiers[config.get("model")].append(name)
+    return list(tiers.values())
+
+
+class GatewayClient:
+    """
+    Stands in for an agent's OpenAIWrapper and sends every `create` call through the gateway.
+    Endpoints of the same model share its calls, the models after the first are fallbacks.
+    """
+
+    def __init__(self, client, endpoints, gateway: "LLMGateway", agent_name: str, report=None, max_tokens: Optional[int] = None):
+        self._client = client
+        self._endpoints = {name: endpoint_client for name, _, endpoint_client in endpoints}
+        self._configs = {name: config for name, config, _ in endpoints}
+        self._tiers = model_tiers(endpoints)
+        self._gateway = gateway
+        self.agent_name = agent_name
+        self.role = agent_role(agent_name)
+        self.report = report
+        self.max_tokens = max_tokens
+
+    def create(self, **config):
+        return self._gateway.call(self, config)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class LLMGateway:
+    """
+    Single point every agent's LLM calls go through.
+
+    Every call waits for its turn in a RequestScheduler shared by all agents attached to the gateway,
+    whichever memo, section or reviewer they belong to: it caps the requests in flight, keeps every key or
+    endpoint within its requests and tokens per minute, lets the writers' calls go ahead of the reviewers'
+    and retries throttled or failed calls with a jittered backoff. A call that times out or fails is retried
+    on the agent's fallback model, if its routing gives it one. Every call is recorded in the run report
+    of its agent.
+    """
+
+    def __init__(self, max_inflight_requests: Optional[int] = None, requests_per_minute: Optional[float] = llm_requests_per_minute, tokens_per_minute: Optional[float] = llm_tokens_per_minute, max_retries: int = llm_max_retries, priority_agents: Iterable[str] = llm_priority_agents):
+        self.max_inflight_requests = max_inflight_requests
+        self.priority_agents = set(priority_agents)
+        self.scheduler = RequestScheduler(max_inflight_requests, requests_per_minute, tokens_per_minute, max_retries)
+        # OpenAIWrapper of every endpoint config, shared by all the agents attached to the gateway
+        self._clients = {}
+
+    def attach(self, agent, report=None) -> None:
+        """
+        Routes the LLM calls of an agent through the gateway and records them in `report`.
+        Agents without an LLM are left alone; agents already attached are moved to this gateway and report.
+        Custom model clients named in the agent's llm_config are registered on first attach, and agents with
+        several endpoints share one client per endpoint.
+        """
+        client = getattr(agent, "client", None)
+        if client is None:
+            return
+        if isinstance(client, GatewayClient):
+            client._gateway = self
+            client.report = report
+            return
+        agent.client = GatewayClient(client, endpoint_clients(agent, self._clients), self, agent.name, report, (agent.llm_config or {}).get("max_tokens"))
+
+    def attach_all(self, agents: Iterable, report=None) -> None:
+        for agent in agents:
+            if agent is not None:
+                self.attach(agent, report)
+
+    def estimate_tokens(self, client: GatewayClient, config) -> int:
+        prompt = "\n".join(str(message.get("content") or "") for message in config.get("messages") or [])
+        return count_tokens(prompt) + (config.get("max_tokens") or client.max_tokens or 0)
+
+    def call(self, client: GatewayClient, config):
+        priority = 0 if client.agent_name in self.priority_agents else 1
+        reserved = self.estimate_tokens(client, config)
+        start = time.time_ns()
+        tier = 0
+        for attempt in range(self.scheduler.max_retries + 1):
+            tier = self._available_tier(client, tier)
+            endpoint = self.scheduler.acquire(client._tiers[tier], reserved, priority)
+            try:
+                response = client._endpoints[endpoint.name].create(**config)
+            except Exception as e:
+                tier, seconds = self._failed(client, endpoint, e, attempt, tier, start, reserved)
+                if seconds:
+                    time.sleep(seconds)
+                continue
+            self._succeeded(client, endpoint, response, config, attempt, tier, start, reserved)
+            return response
+
+    def _available_tier(self, client: GatewayClient, tier: int) -> int:
+        # A model whose endpoints are all paused by rate limits is skipped; the last one is waited for
+        while tier < len(client._tiers) - 1 and not self.scheduler.available(client._tiers[tier]):
+            tier += 1
+        return tier
+
+    def _failed(self, client: GatewayClient, endpoint, error: Exception, attempt: int, tier: int, start: int, reserved: int):
+        """Settles a failed call and returns the tier and delay of its retry, or raises when it is not retried."""
+        self.scheduler.release(endpoint, reserved)
+        delay = retry_delay(error)
+        if delay is None or attempt == self.scheduler.max_retries:
+            if client.report is not None:
+                client.report.record_llm_call(client.agent_name, start, time.time_ns(), retries=attempt, error=repr(error), role=client.role, fallbacks=tier)
+            raise error
+        seconds = self.scheduler.backoff(endpoint, attempt, error, delay)
+        if tier < len(client._tiers) - 1 and getattr(error, "status_code", None) != 429:
+            # The model timed out or failed, the retry goes to the next model right away
+            self.scheduler.fallback(endpoint)
+            return tier + 1, 0.0
+        return tier, seconds
+
+    def _succeeded(self, client: GatewayClient, endpoint, response, config, attempt: int, tier: int, start: int, reserved: int) -> None:
+        usage = getattr(response, "usage", None)
+        cache_hit = getattr(config.get("cache"), "last_lookup_hit", False)
+        used = (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+        self.scheduler.release(endpoint, reserved, used if usage is not None else None, cache_hit)
+        if client.report is not None:
+            client.report.record_llm_call(
+                client.agent_name,
+                start,
+                time.time_ns(),
+                model=getattr(response, "model", None),
+                prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+                # Calls retried by the scheduler; OpenAIWrapper's config_id counts the entries it fell back along
+                retries=attempt + (getattr(response, "config_id", 0) or 0),
+                cache_hit=cache_hit,
+                role=client.role,
+                fallbacks=tier,
+            )
+
+    def stats(self):
+        return self.scheduler.stats()
@@ -0,0 +1,151 @@
+# ./src/llm_cache.py
+
+from typing import Any, Dict, Optional
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+CACHE_MODES = ("off", "read-only", "read-write")
+
+
+class ResponseCache:
+    """
+    Content-addressed SQLite cache for LLM responses.
+
+    Implements the cache protocol autogen expects (`get`, `set`, `close` and the context manager methods),
+    so it can be passed wherever autogen accepts a `cache`. autogen builds the key from the request
+    parameters (model, system message, message list and sampling parameters); the key is hashed so
+    identical requests share one entry whichever agent sends them.
+
+    Entries older than `ttl_seconds` are dropped, and once the cache holds more than `max_entries`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = "./.cache/memogen_llm_cache.sqlite",
+        mode: str = "read-write",
+        max_entries: Optional[int] = 10000,
+        ttl_seconds: Optional[float] = None,
+    ):
+        if mode not in CACHE_MODES or mode == "off":
+            raise ValueError(f"ResponseCache mode must be 'read-only' or 'read-write', got: {mode}")
+        self.path = path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @property
+    def last_lookup_hit(self) -> bool:
+        """Whether the most recent `get` on the calling thread was served from the cache."""
+        return getattr(self._local, "hit", False)
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        digest = self._digest(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (digest,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                if self.mode == "read-write":
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (digest,))
+                    self._conn.commit()
+                    self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                self._local.hit = False
+                return default
+            if self.mode == "read-write":
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, digest))
+                self._conn.commit()
+            self.hits += 1
+        self._local.hit = True
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        if self.mode != "read-write":
+            return
+        try:
+            blob = pickle.dumps(value)
+        except Exception as e:
+            logging.warning(f"Response could not be cached: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (self._digest(key), blob, now, now),
+            )
+            self.writes += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.evictions += max(cursor.rowcount, 0)
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                cursor = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self.evictions += max(cursor.rowcount, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the hit, miss, write and eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # autogen wraps every lookup in a `with` block, so entering and leaving must not close the connection
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        return None
+
+
+def open_response_cache(mode: str, path: str, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None) -> Optional[ResponseCache]:
+    """Returns a ResponseCache for the given mode, or None when caching is off."""
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode: {mode}. Choose one of {', '.join(CACHE_MODES)}")
+    if mode == "off":
+        return None
+    return ResponseCache(path=path, mode=mode, max_entries=max_entries, ttl_seconds=ttl_seconds)
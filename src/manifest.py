@@ -0,0 +1,196 @@
+# ./src/manifest.py
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+SECTION_STATES = ("outlined", "drafted", "refined")
+
+
+def content_hash(text: str) -> str:
+    """Returns the sha256 hex digest of a section's markdown."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def inputs_hash(*inputs) -> str:
+    """Returns the sha256 hex digest of the JSON-serialisable inputs a step's output depends on."""
+    return content_hash(json.dumps(inputs, sort_keys=True, ensure_ascii=False))
+
+
+def new_run_id() -> str:
+    """Returns a sortable, unique identifier for a memo run."""
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class RunManifest:
+    """
+    Checkpoint of a memo run, stored as `manifest.json` in the run's directory.
+
+    It records the user inputs, the outline and, for every section, its file, the outline chunk it was
+    created from, how far it got (outlined, drafted or refined) and the hash of its current content.
+    The outline and sections also record a hash of the inputs they were generated from, so a later run
+    can reuse those whose inputs did not change.
+    The manifest is rewritten atomically after every step, so an interrupted run can be resumed.
+    """
+
+    def __init__(self, path: str, data: Dict[str, Any]):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, run_directory: str, run_id: str, topic: str, audience: str, memo_type: str, settings: Optional[Dict[str, Any]] = None) -> "RunManifest":
+        """Starts the manifest of a run; `settings` are the options a resumed run is restored with, such as its agent profile."""
+        os.makedirs(run_directory, exist_ok=True)
+        manifest = cls(
+            os.path.join(run_directory, "manifest.json"),
+            {
+                "run_id": run_id,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "topic": topic,
+                "audience": audience,
+                "memo_type": memo_type,
+                "settings": settings or {},
+                "outline": None,
+                "sections": [],
+                "docx": None,
+            },
+        )
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, run_directory: str) -> "RunManifest":
+        path = os.path.join(run_directory, "manifest.json")
+        if not os.path.exists(path):
+            raise ValueError(f"No run manifest found at: {path}")
+        with open(path, "r", encoding="utf-8") as file:
+            return cls(path, json.load(file))
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(self.data, file, indent=4)
+        os.replace(temporary_path, self.path)
+
+    @property
+    def run_id(self) -> str:
+        return self.data["run_id"]
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return self.data.get("settings") or {}
+
+    @property
+    def outline(self) -> Optional[str]:
+        return self.data["outline"]
+
+    @property
+    def outline_inputs(self) -> Optional[str]:
+        return self.data.get("outline_inputs")
+
+    def set_outline(self, outline: str, inputs: Optional[str] = None) -> None:
+        """Records the outline and the hash of the inputs it was created from; None for an outline given by the user."""
+        with self._lock:
+            self.data["outline"] = outline
+            self.data["outline_inputs"] = inputs
+            self._save()
+
+    def set_sections(self, filenames: List[str], chunks: List[str], inputs: Optional[List[str]] = None) -> None:
+        """Records the section files parsed from the outline, all in the outlined state, with the hashes of their inputs."""
+        inputs = inputs or [None] * len(filenames)
+        with self._lock:
+            self.data["sections"] = [
+                {"filename": filename, "outline": chunk, "state": "outlined", "sha256": content_hash(chunk), "inputs": section_inputs}
+                for filename, chunk, section_inputs in zip(filenames, chunks, inputs)
+            ]
+            self._save()
+
+    @property
+    def filenames(self) -> List[str]:
+        return [section["filename"] for section in self.data["sections"]]
+
+    def _section(self, filename: str) -> Dict[str, Any]:
+        for section in self.data["sections"]:
+            if section["filename"] == filename:
+                return section
+        raise KeyError(f"Section not in run manifest: {filename}")
+
+    def mark(self, filename: str, state: str, markdown_string: str) -> None:
+        """Records that a section reached `state` with the given content."""
+        if state not in SECTION_STATES:
+            raise ValueError(f"Unknown section state: {state}")
+        with self._lock:
+            section = self._section(filename)
+            section["state"] = state
+            section["sha256"] = content_hash(markdown_string)
+            self._save()
+
+    def inputs(self, filename: str) -> Optional[str]:
+        with self._lock:
+            return self._section(filename).get("inputs")
+
+    def reusable_sections(self) -> Dict[str, str]:
+        """Returns the markdown of every refined section, by the hash of its inputs, skipping files changed since."""
+        reusable = {}
+        with self._lock:
+            sections = [section for section in self.data["sections"] if section["state"] == "refined" and section.get("inputs")]
+        for section in sections:
+            if not os.path.exists(section["filename"]):
+                continue
+            with open(section["filename"], "r", encoding="utf-8") as file:
+                markdown_string = file.read()
+            if content_hash(markdown_string) == section["sha256"]:
+                reusable[section["inputs"]] = markdown_string
+        return reusable
+
+    def state(self, filename: str) -> str:
+        with self._lock:
+            return self._section(filename)["state"]
+
+    def reached(self, filename: str, state: str) -> bool:
+        """Whether a section is at `state` or further along."""
+        return SECTION_STATES.index(self.state(filename)) >= SECTION_STATES.index(state)
+
+    def verify_sections(self) -> List[str]:
+        """
+        Checks every section file against its recorded hash.
+
+        Sections whose file is missing or was changed outside the run are restored from their outline
+        chunk and set back to the outlined state.
+
+        Returns:
+            list: The filenames that were restored.
+        """
+        restored = []
+        with self._lock:
+            for section in self.data["sections"]:
+                filename = section["filename"]
+                current = None
+                if os.path.exists(filename):
+                    with open(filename, "r", encoding="utf-8") as file:
+                        current = file.read()
+                if current is not None and content_hash(current) == section["sha256"]:
+                    continue
+                os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+                with open(filename, "w", encoding="utf-8") as file:
+                    file.write(section["outline"])
+                section["state"] = "outlined"
+                section["sha256"] = content_hash(section["outline"])
+                restored.append(filename)
+            if restored:
+                self._save()
+        return restored
+
+    def set_docx(self, docx_path: str) -> None:
+        with self._lock:
+            self.data["docx"] = docx_path
+            self._save()
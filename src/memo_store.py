@@ -0,0 +1,220 @@
+# ./src/memo_store.py
+
+from chromadb.api.types import EmbeddingFunction
+from chromadb.config import Settings
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import chromadb
+import hashlib
+import logging
+import re
+import threading
+import time
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """
+    Wraps a Chroma embedding function with an LRU cache of embeddings by text.
+
+    Reviewers see the same sections and feedback over and over, so most lookups are repeated texts.
+    The texts missing from the cache are embedded in a single batch call.
+    """
+
+    def __init__(self, embedding_function=None, max_entries: int = 2048):
+        if embedding_function is None:
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            embedding_function = DefaultEmbeddingFunction()
+        self.embedding_function = embedding_function
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, input: List[str]):
+        embeddings = [None] * len(input)
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            for position, text in enumerate(input):
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    embeddings[position] = self._cache[text]
+                    self.hits += 1
+                else:
+                    missing.setdefault(text, []).append(position)
+                    self.misses += 1
+        if missing:
+            texts = list(missing)
+            for text, embedding in zip(texts, self.embedding_function(texts)):
+                for position in missing[text]:
+                    embeddings[position] = embedding
+                with self._lock:
+                    self._cache[text] = embedding
+                    self._cache.move_to_end(text)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+        return embeddings
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def namespace_collection(namespace: str) -> str:
+    """Returns a valid Chroma collection name for a memo namespace, such as a memo type."""
+    slug = re.sub(r'[^a-z0-9]+', '-', namespace.lower()).strip('-') or "general"
+    return f"memos-{slug}"[:63].rstrip('-')
+
+
+class PersistentMemoStore:
+    """
+    Local, persistent replacement for autogen's Teachability MemoStore.
+
+    Memos live in an embedded Chroma database on disk, in one collection per namespace, and survive restarts.
+    A memo's id is the hash of its texts, so a lesson learned again is updated rather than stored twice.
+    New memos are embedded and written in one batch when Teachability saves them, embeddings go through a
+    shared LRU cache, and beyond `max_memos` the least recently recalled memos of the namespace are evicted.
+    Every retrieval is timed and logged. One store is meant to be shared by all the teams of a namespace.
+    """
+
+    def __init__(self, path_to_db_dir: str, namespace: str, embedding_function: CachedEmbeddingFunction, max_memos: int = 2000, verbosity: int = 0):
+        self.path_to_db_dir = path_to_db_dir
+        self.namespace = namespace
+        self.max_memos = max_memos
+        self.verbosity = verbosity
+        self.embedding_function = embedding_function
+        settings = Settings(anonymized_telemetry=False, allow_reset=True, is_persistent=True, persist_directory=path_to_db_dir)
+        self.db_client = chromadb.Client(settings)
+        self.collection_name = namespace_collection(namespace)
+        self.vec_db = self.db_client.get_or_create_collection(self.collection_name, embedding_function=embedding_function)
+        self.retrievals = 0
+        self.retrieval_seconds = 0.0
+        self._pending: Dict[str, Tuple[str, str]] = {}
+        self._recalled: Dict[str, float] = {}
+        self._nearest: Optional[Tuple[str, Tuple[str, str, float]]] = None
+        self._lock = threading.RLock()
+
+    @property
+    def last_memo_id(self) -> int:
+        """The number of memos, Teachability only looks memos up when there are any."""
+        with self._lock:
+            return self.vec_db.count() + len(self._pending)
+
+    @property
+    def uid_text_dict(self) -> Dict[str, Tuple[str, str]]:
+        """Every memo by id, as (input text, output text)."""
+        with self._lock:
+            self._flush()
+            memos = self.vec_db.get(include=["documents", "metadatas"])
+        return {uid: (document, metadata["output"]) for uid, document, metadata in zip(memos["ids"], memos["documents"], memos["metadatas"])}
+
+    def list_memos(self):
+        for uid, (input_text, output_text) in self.uid_text_dict.items():
+            print(f"  ID: {uid}\n    INPUT TEXT: {input_text}\n    OUTPUT TEXT: {output_text}")
+
+    def add_input_output_pair(self, input_text: str, output_text: str):
+        """Queues a memo; it is embedded and written with the others when the memos are saved."""
+        uid = hashlib.sha256(f"{input_text}\x00{output_text}".encode("utf-8")).hexdigest()[:32]
+        with self._lock:
+            self._pending[uid] = (input_text, output_text)
+        if self.verbosity >= 1:
+            logging.info(f"Memo queued in {self.collection_name}: {input_text} -> {output_text}")
+
+    def save(self):
+        """Writes the queued memos and when memos were last recalled, then evicts beyond the size limit."""
+        with self._lock:
+            self._flush()
+            self._save_recalls()
+            self._evict()
+
+    def _save_memos(self):
+        # Called by Teachability after it added memos
+        self.save()
+
+    def _flush(self) -> None:
+        if self._pending:
+            now = time.time()
+            uids = list(self._pending)
+            documents = [self._pending[uid][0] for uid in uids]
+            self.vec_db.upsert(
+                ids=uids,
+                documents=documents,
+                embeddings=self.embedding_function(documents),
+                metadatas=[{"output": self._pending[uid][1], "recalled_at": now} for uid in uids],
+            )
+            self._pending.clear()
+
+    def _save_recalls(self) -> None:
+        # Recall times are kept in memory between saves, so retrievals do not write to the database
+        if not self._recalled:
+            return
+        recalled = self._recalled
+        self._recalled = {}
+        existing = self.vec_db.get(ids=list(recalled), include=["metadatas"])
+        if existing["ids"]:
+            self.vec_db.update(
+                ids=existing["ids"],
+                metadatas=[{**metadata, "recalled_at": recalled[uid]} for uid, metadata in zip(existing["ids"], existing["metadatas"])],
+            )
+
+    def _evict(self) -> None:
+        excess = self.vec_db.count() - self.max_memos
+        if excess <= 0:
+            return
+        memos = self.vec_db.get(include=["metadatas"])
+        by_recall = sorted(zip(memos["ids"], memos["metadatas"]), key=lambda memo: memo[1].get("recalled_at", 0))
+        self.vec_db.delete(ids=[uid for uid, _ in by_recall[:excess]])
+        logging.info(f"Evicted {excess} least recently recalled memos from {self.collection_name}")
+
+    def reset_db(self):
+        """Deletes every memo of the namespace."""
+        with self._lock:
+            self.db_client.delete_collection(self.collection_name)
+            self.vec_db = self.db_client.get_or_create_collection(self.collection_name, embedding_function=self.embedding_function)
+            self._pending.clear()
+            self._recalled.clear()
+            self._nearest = None
+
+    def get_related_memos(self, query_text: str, n_results: int, threshold) -> List[Tuple[str, str, float]]:
+        """Retrieves the memos within `threshold` distance of the query, nearest first."""
+        start = time.perf_counter()
+        with self._lock:
+            self._flush()
+            n_results = min(n_results, self.vec_db.count())
+            if n_results == 0:
+                return []
+            results = self.vec_db.query(query_embeddings=self.embedding_function([query_text]), n_results=n_results, include=["documents", "metadatas", "distances"])
+            memos = []
+            now = time.time()
+            for uid, input_text, metadata, distance in zip(results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]):
+                if distance < threshold:
+                    memos.append((input_text, metadata["output"], distance))
+                    self._recalled[uid] = now
+            # Teachability asks for the nearest memo right after a lookup that found nothing
+            if results["ids"][0]:
+                self._nearest = (query_text, (results["documents"][0][0], results["metadatas"][0][0]["output"], results["distances"][0][0]))
+            seconds = time.perf_counter() - start
+            self.retrievals += 1
+            self.retrieval_seconds += seconds
+        logging.info(f"Memo retrieval from {self.collection_name} in {seconds * 1000:.1f} ms: {len(memos)} of {n_results} memos within {threshold}")
+        return memos
+
+    def get_nearest_memo(self, query_text: str) -> Tuple[str, str, float]:
+        """Retrieves the nearest memo to the query, reusing the lookup that was just made for it."""
+        with self._lock:
+            if self._nearest is not None and self._nearest[0] == query_text:
+                return self._nearest[1]
+        memos = self.get_related_memos(query_text, n_results=1, threshold=float("inf"))
+        return memos[0] if memos else None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            count = self.vec_db.count() + len(self._pending)
+            average = self.retrieval_seconds / self.retrievals if self.retrievals else 0.0
+            return {
+                "namespace": self.namespace,
+                "memos": count,
+                "retrievals": self.retrievals,
+                "average_retrieval_ms": round(average * 1000, 2),
+                "embeddings": self.embedding_function.stats(),
+            }
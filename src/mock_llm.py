@@ -0,0 +1,133 @@
+# ./src/mock_llm.py
+
+from src.context import count_tokens, markdown_heading
+from typing import TYPE_CHECKING, Any, Dict, List
+import hashlib
+import random
+import re
+import time
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
+WORDS = (
+    "revenue margin growth audience capital risk forecast strategy market liquidity cost investment "
+    "compliance customer operations portfolio valuation return policy budget analysis outlook evidence "
+    "assumption scenario benchmark exposure governance efficiency demand supply pricing"
+).split()
+
+
+class MockModelClient:
+    """
+    Offline stand-in for the OpenAI client that follows autogen's ModelClient protocol.
+
+    Every request is answered with markdown generated from a hash of its messages, so the same prompt always
+    gets the same response, after `mock_latency` seconds. Use it with an llm_config entry such as
+    `{"model": "mock", "model_client_cls": "MockModelClient"}`; the optional keys are:
+
+        mock_latency (float): Seconds every call takes. Default 0.
+        mock_completion_tokens (int): Approximate length of the generated responses. Default 300.
+        mock_outline_sections (int): Number of sections in a generated outline. Default 8.
+        mock_response (str): Canned response returned for every request instead of generated markdown.
+
+    Requests with "stream" print their response in chunks as they are generated, like autogen's OpenAI client.
+    """
+
+    def __init__(self, config: Dict[str, Any], **kwargs):
+        self.model = config.get("model", "mock")
+        self.latency = float(config.get("mock_latency", 0.0))
+        self.completion_tokens = int(config.get("mock_completion_tokens", 300))
+        self.outline_sections = int(config.get("mock_outline_sections", 8))
+        self.response = config.get("mock_response")
+
+    def create(self, params: Dict[str, Any]) -> "ChatCompletion":
+        # The openai package takes most of a second to import, it is only needed once a call is made
+        from openai.types.chat import ChatCompletion
+
+        messages = params.get("messages", [])
+        prompt = "\n".join(str(message.get("content") or "") for message in messages)
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        last = str(messages[-1].get("content") or "") if messages else ""
+        if self.response is not None:
+            content = self.response
+        elif last.startswith("Create an outline"):
+            content = self.generate_outline(random.Random(seed))
+        else:
+            content = self.generate_section(random.Random(seed), last)
+            if "SCORE:" in last:
+                # The scorer is asked to end with a score, between 5 and 10 so the quality gate both accepts and refines
+                content += f"\n\nSCORE: {random.Random(seed).randint(5, 10)}"
+        if params.get("stream"):
+            self.stream(content)
+        elif self.latency:
+            time.sleep(self.latency)
+        prompt_tokens = count_tokens(prompt, self.model)
+        completion_tokens = count_tokens(content, self.model)
+        return ChatCompletion(
+            id=f"mock-{seed:016x}",
+            created=int(time.time()),
+            model=self.model,
+            object="chat.completion",
+            choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+    def stream(self, content: str) -> None:
+        """Prints the response word by word to autogen's IOStream, the way its OpenAI client prints streamed chunks, over `mock_latency` seconds."""
+        from autogen.io import IOStream
+
+        iostream = IOStream.get_default()
+        chunks = re.findall(r'\S+\s*|\s+', content)
+        iostream.print("\033[32m", end="")
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            iostream.print(chunk, end="", flush=True)
+        iostream.print("\033[0m\n")
+
+    def sentence(self, rng: random.Random) -> str:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+        return " ".join(words).capitalize() + "."
+
+    def paragraph(self, rng: random.Random, words: int) -> str:
+        sentences = []
+        while words > 0:
+            sentence = self.sentence(rng)
+            sentences.append(sentence)
+            words -= len(sentence.split())
+        return " ".join(sentences)
+
+    def generate_outline(self, rng: random.Random) -> str:
+        parts = ["# Memo\n\nIntroduction of the memo.\n"]
+        for index in range(1, self.outline_sections + 1):
+            parts.append(f"## Section {index}\n\n- {self.sentence(rng)}\n- {self.sentence(rng)}\n")
+        return "\n".join(parts)
+
+    def generate_section(self, rng: random.Random, request: str) -> str:
+        # Writers are asked about a FOCUS SECTION, keep its heading so the memo structure survives
+        focus = re.search(r'FOCUS SECTION :\s*(.*?)\n---', request, re.DOTALL)
+        heading = markdown_heading(focus.group(1)) if focus else ""
+        # Tokens are roughly three quarters of a word
+        words = max(1, self.completion_tokens * 3 // 4)
+        parts = [f"## {heading}" if heading else "## Review"]
+        parts.append(self.paragraph(rng, words * 2 // 3))
+        parts.append("\n".join(f"- {self.sentence(rng)}" for _ in range(3)))
+        parts.append(self.paragraph(rng, words // 3 - 30))
+        return "\n\n".join(parts)
+
+    def message_retrieval(self, response: "ChatCompletion") -> List[str]:
+        # Plain strings, like the OpenAI client returns for messages without tool calls
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response: "ChatCompletion") -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response: "ChatCompletion") -> Dict:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": response.cost,
+            "model": response.model,
+        }
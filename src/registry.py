@@ -0,0 +1,97 @@
+# ./src/registry.py
+
+from src.config import teachability_db_path, reset_teachability_db, teachability_max_memos, embedding_cache_size
+from src.prompts import get_system_messages
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import threading
+
+DEFAULT_PROFILE = ("general", "General")
+AGENT_KINDS = ("outliner", "team")
+
+
+class AgentRegistry:
+    """
+    Builds the memo agents on first use and keeps them for reuse, per (audience, memo_type) profile.
+
+    Nothing heavy happens when the registry is created: autogen, the Teachability memo store and its embedded
+    Chroma database are only imported and opened when a memo first needs them. All the teams of a memo type share one
+    persistent memo store, so what a reviewer learned carries over to the next memos and runs. Agents keep chat state while they work,
+    so they are checked out by one memo or section worker at a time and returned to the registry afterwards,
+    where the next memo with the same profile picks them up already built.
+    """
+
+    def __init__(self, reset_memo_db: bool = reset_teachability_db, memo_db_path: str = teachability_db_path):
+        """
+        Args:
+            reset_memo_db (bool): Clear the memos of a memo type when its first team of the process is built.
+            memo_db_path (str): Directory of the persistent Teachability memo database.
+        """
+        self.reset_memo_db = reset_memo_db
+        self.memo_db_path = memo_db_path
+        self._messages: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._idle: Dict[Tuple[str, str, str], List] = defaultdict(list)
+        self._memo_stores: Dict[str, object] = {}
+        self._embedding_function = None
+        self._lock = threading.Lock()
+
+    def messages(self, audience: str, memo_type: str) -> Dict[str, str]:
+        """Returns the system messages of a profile."""
+        with self._lock:
+            key = (audience, memo_type)
+            if key not in self._messages:
+                self._messages[key] = get_system_messages(audience=audience, memo_type=memo_type)
+            return self._messages[key]
+
+    def acquire(self, kind: str, audience: str, memo_type: str):
+        """Checks out an idle outliner or section team of a profile, building one if none is idle."""
+        if kind not in AGENT_KINDS:
+            raise ValueError(f"Unknown agent kind: {kind}")
+        with self._lock:
+            idle = self._idle[(kind, audience, memo_type)]
+            if idle:
+                return idle.pop()
+        messages = self.messages(audience, memo_type)
+        # Imported here, autogen and chromadb take seconds to import
+        from src import agents
+        if kind == "outliner":
+            return agents.create_outliner(messages)
+        return agents.SectionTeam(messages, self.teachability(memo_type))
+
+    def release(self, kind: str, audience: str, memo_type: str, agent) -> None:
+        """Returns a checked out outliner or team to the registry."""
+        with self._lock:
+            self._idle[(kind, audience, memo_type)].append(agent)
+
+    @contextmanager
+    def use(self, kind: str, audience: str, memo_type: str):
+        """Checks out an outliner or section team for the duration of a `with` block."""
+        agent = self.acquire(kind, audience, memo_type)
+        try:
+            yield agent
+        finally:
+            self.release(kind, audience, memo_type, agent)
+
+    def teachability(self, memo_type: str):
+        """Builds a Teachability capability on the shared memo store of a memo type."""
+        from src import agents
+        return agents.create_teachability(self.memo_store(memo_type))
+
+    def memo_store(self, memo_type: str):
+        """Opens the persistent memo store of a memo type on first use, clearing it first if the registry was asked to."""
+        with self._lock:
+            if memo_type not in self._memo_stores:
+                from src.memo_store import CachedEmbeddingFunction, PersistentMemoStore
+                if self._embedding_function is None:
+                    self._embedding_function = CachedEmbeddingFunction(max_entries=embedding_cache_size)
+                store = PersistentMemoStore(self.memo_db_path, memo_type, self._embedding_function, max_memos=teachability_max_memos)
+                if self.reset_memo_db:
+                    store.reset_db()
+                self._memo_stores[memo_type] = store
+            return self._memo_stores[memo_type]
+
+    def memo_stores(self) -> List:
+        """Returns the memo stores opened so far."""
+        with self._lock:
+            return list(self._memo_stores.values())
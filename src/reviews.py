@@ -0,0 +1,112 @@
+# ./src/reviews.py
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import ast
+import json
+import re
+
+JSON_BLOCK = re.compile(r'\{.*\}', re.DOTALL)
+SCORE_PATTERN = re.compile(r'SCORE\W{0,3}\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+SCORE_INSTRUCTION = "End with a last line `SCORE: <0-10>` rating how ready the section is for AUDIENCE, 10 meaning it needs no changes."
+
+
+def parse_score(text: str) -> Optional[float]:
+    """Returns the last `SCORE: n` of a review, clamped to 0-10, or None when it has none."""
+    scores = SCORE_PATTERN.findall(text or "")
+    if not scores:
+        return None
+    return min(10.0, max(0.0, float(scores[-1])))
+
+
+def extract_review(text: str, reviewer: str) -> Dict[str, str]:
+    """
+    Returns a review as {"Reviewer": ..., "Review": ...}.
+
+    Reviewers that already answered with such an object, as JSON or a Python dict, possibly inside a code
+    fence, have it read as is; any other answer becomes the review text, without its TERMINATE marker.
+    """
+    text = (text or "").strip()
+    match = JSON_BLOCK.search(text)
+    if match:
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                parsed = parse(match.group(0))
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(parsed, dict) and parsed.get("Review"):
+                return {"Reviewer": str(parsed.get("Reviewer") or reviewer), "Review": str(parsed["Review"])}
+    return {"Reviewer": reviewer, "Review": text.replace("TERMINATE", "").strip()}
+
+
+def structured_review_summary(sender, recipient, summary_args: Dict[str, Any]) -> str:
+    """
+    Summary method of a reviewer chat that extracts the review locally, as the JSON object the meta reviewer
+    reads, instead of asking the model to restate it with `reflection_with_llm`.
+    """
+    message = recipient.last_message(sender) or {}
+    reviewer = summary_args.get("reviewer") or recipient.name
+    return json.dumps(extract_review(message.get("content"), reviewer), ensure_ascii=False)
+
+
+def prepare_nested_chats(chat_queue: List[Dict[str, Any]], recipient, messages: List[Dict], sender, config: Any) -> List[Dict[str, Any]]:
+    """Resolves the sender and message of every nested chat, the same way autogen's summary_from_nested_chats does."""
+    last_msg = messages[-1].get("content")
+    chat_to_run = []
+    for i, c in enumerate(chat_queue):
+        current_c = c.copy()
+        if current_c.get("sender") is None:
+            current_c["sender"] = recipient
+        message = current_c.get("message")
+        if message is None and i == 0:
+            message = last_msg
+        if callable(message):
+            message = message(recipient, messages, sender, config)
+        if message:
+            current_c["message"] = message
+            chat_to_run.append(current_c)
+    return chat_to_run
+
+
+def run_parallel_reviews(chats: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Runs independent review chats concurrently, then the aggregating chat.
+
+    Every chat but the last one only reviews the writer's content, so they run at the same time. They must
+    have different senders: `initiate_chat` saves and restores its sender's cache without a lock.
+    Their summaries are passed, in queue order, to the last chat as carryover, which is what
+    autogen's sequential `initiate_chats` would have given it.
+
+    Returns:
+        list: The ChatResult of every chat, in queue order.
+    """
+    if not chats:
+        return []
+    reviews, aggregate = chats[:-1], dict(chats[-1])
+
+    def review(chat):
+        return chat["sender"].initiate_chat(**chat)
+
+    if reviews:
+        with ThreadPoolExecutor(max_workers=len(reviews)) as executor:
+            results = list(executor.map(review, reviews))
+    else:
+        results = []
+
+    carryover = aggregate.get("carryover", [])
+    if isinstance(carryover, str):
+        carryover = [carryover]
+    aggregate["carryover"] = carryover + [result.summary for result in results]
+    results.append(aggregate["sender"].initiate_chat(**aggregate))
+    return results
+
+
+def parallel_summary_from_nested_chats(
+    chat_queue: List[Dict[str, Any]], recipient, messages: Optional[List[Dict]] = None, sender=None, config: Any = None
+) -> Tuple[bool, Optional[str]]:
+    """Nested-chat reply function that fans the reviewer chats out in parallel before the last (meta review) chat."""
+    chat_to_run = prepare_nested_chats(chat_queue, recipient, messages, sender, config)
+    if not chat_to_run:
+        return True, None
+    results = run_parallel_reviews(chat_to_run)
+    return True, results[-1].summary
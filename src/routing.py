@@ -0,0 +1,67 @@
+# ./src/routing.py
+
+from src.config import model_tiers, model_fallbacks, agent_routes
+from src.transport import http_client, uses_http_client
+from typing import Any, Dict, List
+
+# Role of every agent, by name, that agent_routes assigns a tier and settings to
+AGENT_ROLES = {
+    "Outliner": "outliner",
+    "Writer": "writer",
+    "Critic": "critic",
+    "Layman Reviewer": "reviewer",
+    "Financial Reviewer": "reviewer",
+    "Quality Assurance Reviewer": "reviewer",
+    "Meta Reviewer": "meta_reviewer",
+    "Scorer": "scorer",
+    "chat_manager": "chat_manager",
+    "analyzer": "analyzer",
+}
+# Settings that come from the route rather than from the tier's entries
+ROUTE_KEYS = ("max_tokens", "temperature", "stream", "cache_seed")
+
+
+def agent_role(agent_name: str) -> str:
+    return AGENT_ROLES.get(agent_name, "default")
+
+
+def route(role: str) -> Dict[str, Any]:
+    """Returns the tier, max_tokens, temperature and streaming of a role, falling back to the default route."""
+    return {**agent_routes["default"], **agent_routes.get(role, {})}
+
+
+def tier_chain(tier: str) -> List[str]:
+    """Returns a tier followed by the tiers it falls back to, in order."""
+    return [tier] + [fallback for fallback in model_fallbacks.get(tier, []) if fallback != tier]
+
+
+def llm_config_for(role: str) -> Dict[str, Any]:
+    """
+    Returns the llm_config of an agent role.
+
+    Its config list holds the entries of the role's tier followed by those of the tiers it falls back to.
+    The gateway spreads calls over the entries of one model and moves to the next model when a call fails.
+    """
+    settings = route(role)
+    config_list = []
+    for tier in tier_chain(settings["tier"]):
+        tier_config = model_tiers[tier]
+        base = {key: value for key, value in tier_config.items() if key != "config_list" and key not in ROUTE_KEYS}
+        for entry in tier_config.get("config_list") or [{}]:
+            config = {**base, **{key: value for key, value in entry.items() if key not in ROUTE_KEYS}}
+            if uses_http_client(config) and "http_client" not in config:
+                # Every agent's OpenAI client sends its calls over the same pooled connections
+                config["http_client"] = http_client()
+            # Tiers can share a model, such as with the mock backend, its entries are only listed once
+            if config not in config_list:
+                config_list.append(config)
+    llm_config = {"config_list": config_list, "cache_seed": None}
+    for key in ("max_tokens", "temperature", "stream"):
+        if settings.get(key) is not None:
+            llm_config[key] = settings[key]
+    return llm_config
+
+
+def role_model(role: str) -> str:
+    """Returns the first model a role is routed to."""
+    return llm_config_for(role)["config_list"][0].get("model", "gpt-4o")
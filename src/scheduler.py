@@ -0,0 +1,214 @@
+# ./src/scheduler.py
+
+from typing import Dict, List, Optional
+import hashlib
+import itertools
+import random
+import threading
+import time
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = (408, 409, 429)
+RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError", "TimeoutError")
+
+
+def endpoint_name(config: Dict) -> str:
+    """Names the endpoint of an llm_config entry by model, base url and a hash of its key, which rate limits apply to."""
+    key = hashlib.sha256(str(config.get("api_key") or "").encode("utf-8")).hexdigest()[:8]
+    return f"{config.get('model')}@{config.get('base_url') or config.get('api_type') or 'default'}#{key}"
+
+
+def retry_delay(error: Exception) -> Optional[float]:
+    """Returns the delay the server asked for before retrying a failed call (0 when it did not), or None when it should not be retried."""
+    status = getattr(error, "status_code", None)
+    retryable = status in RETRYABLE_STATUSES or (status is not None and status >= 500) or type(error).__name__ in RETRYABLE_ERRORS
+    if not retryable:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute, holding at most one minute's worth. Not thread-safe on its own."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available; amounts above the capacity only wait for a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        """Returns units, or charges them when `amount` is negative; a bucket can go into debt."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Endpoint:
+    """Rate limits and counters of one API key or endpoint."""
+
+    def __init__(self, name: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.cooldown_until = 0.0
+        self.inflight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.fallbacks = 0
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = max(0.0, self.cooldown_until - now)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def take(self, tokens: int, now: float) -> None:
+        if self.requests is not None:
+            self.requests.take(1, now)
+        if self.tokens is not None:
+            self.tokens.take(tokens, now)
+        self.inflight += 1
+        self.calls += 1
+
+
+class RequestScheduler:
+    """
+    Admits the LLM requests of every agent against the rate limits of the endpoints they can use.
+
+    Each endpoint has token buckets for requests and tokens per minute. A request reserves one request and its
+    estimated tokens (prompt plus max_tokens, the way OpenAI counts them) before it is sent, and the reservation
+    is settled with the tokens it actually used, or refunded when the response came from the cache.
+    Waiting requests are admitted by priority, then in arrival order, each on the endpoint that can take it
+    soonest, so load spreads over several keys. The order only holds among requests for the same endpoints:
+    a request throttled on one model does not hold back the requests for another. Failed calls are retried after a jittered exponential backoff;
+    a 429 pauses its endpoint for that long instead, so the retry and other requests move to another key.
+    """
+
+    def __init__(self, max_inflight_requests: Optional[int] = None, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None, max_retries: int = 5, backoff_seconds: float = 1.0, max_backoff_seconds: float = 60.0):
+        self.max_inflight_requests = max_inflight_requests
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.queued_seconds = 0.0
+        self._endpoints: Dict[str, Endpoint] = {}
+        # Endpoint names of every waiting request, by (priority, arrival) ticket
+        self._waiting: Dict[tuple, frozenset] = {}
+        self._sequence = itertools.count()
+        self._inflight = 0
+        self._condition = threading.Condition()
+
+    def endpoint(self, name: str) -> Endpoint:
+        with self._condition:
+            if name not in self._endpoints:
+                self._endpoints[name] = Endpoint(name, self.requests_per_minute, self.tokens_per_minute)
+            return self._endpoints[name]
+
+    def acquire(self, names: List[str], tokens: int, priority: int = 0) -> Endpoint:
+        """Blocks until one of the named endpoints can take a request of `tokens` tokens, and reserves it there."""
+        endpoints = [self.endpoint(name) for name in names]
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        with self._condition:
+            self._waiting[ticket] = frozenset(names)
+            try:
+                while True:
+                    endpoint, timeout = self._take(ticket, endpoints, tokens)
+                    if endpoint is not None:
+                        return endpoint
+                    self._condition.wait(timeout)
+            finally:
+                self._leave(ticket, start)
+
+    def _take(self, ticket, endpoints: List[Endpoint], tokens: int):
+        # Called with the condition held. Returns the reserved endpoint, or None and how long to wait
+        full = self.max_inflight_requests is not None and self._inflight >= self.max_inflight_requests
+        names = self._waiting[ticket]
+        if full or any(other < ticket and names & other_names for other, other_names in self._waiting.items()):
+            return None, None
+        now = time.monotonic()
+        # Ready endpoints first, then the least busy, then the least used
+        waits = [(endpoint.wait_time(tokens, now), endpoint.inflight, endpoint.calls, index) for index, endpoint in enumerate(endpoints)]
+        wait, _, _, index = min(waits)
+        if wait > 0:
+            return None, wait
+        endpoint = endpoints[index]
+        endpoint.take(tokens, now)
+        self._inflight += 1
+        return endpoint, None
+
+    def _leave(self, ticket, start: float) -> None:
+        del self._waiting[ticket]
+        self.queued_seconds += time.monotonic() - start
+        self._condition.notify_all()
+
+    def available(self, names: List[str]) -> bool:
+        """Whether any of the named endpoints is not paused by a rate limit."""
+        now = time.monotonic()
+        with self._condition:
+            return any(self.endpoint(name).cooldown_until <= now for name in names)
+
+    def fallback(self, endpoint: Endpoint) -> None:
+        """Counts a failed call of the endpoint that was retried on a fallback model."""
+        with self._condition:
+            endpoint.fallbacks += 1
+
+    def release(self, endpoint: Endpoint, reserved_tokens: int, used_tokens: Optional[int] = None, cache_hit: bool = False) -> None:
+        """Settles a reservation: cache hits get it all back, other calls are charged the tokens they used."""
+        with self._condition:
+            endpoint.inflight -= 1
+            self._inflight -= 1
+            if cache_hit:
+                endpoint.calls -= 1
+                if endpoint.requests is not None:
+                    endpoint.requests.give(1)
+                if endpoint.tokens is not None:
+                    endpoint.tokens.give(reserved_tokens)
+            elif used_tokens is not None and endpoint.tokens is not None:
+                endpoint.tokens.give(reserved_tokens - used_tokens)
+            self._condition.notify_all()
+
+    def backoff(self, endpoint: Endpoint, attempt: int, error: Exception, delay: float) -> float:
+        """
+        Returns how long to wait before retrying a failed call.
+        A rate limited endpoint is paused instead, so the retry and every other request go to another endpoint
+        or wait for the pause in `acquire`.
+        """
+        seconds = max(delay, random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)))
+        with self._condition:
+            endpoint.retries += 1
+            if getattr(error, "status_code", None) == 429:
+                endpoint.throttled += 1
+                endpoint.cooldown_until = max(endpoint.cooldown_until, time.monotonic() + seconds)
+                seconds = 0.0
+            self._condition.notify_all()
+        return seconds
+
+    def stats(self) -> Dict[str, object]:
+        with self._condition:
+            return {
+                "queued_seconds": round(self.queued_seconds, 3),
+                "endpoints": {
+                    name: {"calls": endpoint.calls, "retries": endpoint.retries, "throttled": endpoint.throttled, "fallbacks": endpoint.fallbacks}
+                    for name, endpoint in self._endpoints.items()
+                },
+            }
@@ -0,0 +1,87 @@
+# ./src/section_store.py
+
+from src.utils import write_text_to_markdown, markdown_to_text
+from src.context import SectionContext, section_context
+from typing import Dict, List
+import threading
+
+
+class SectionStore:
+    """
+    Keeps the markdown of every memo section in memory together with a cached plain-text rendering
+    and the cached heading and summary used to build compressed neighbour context.
+
+    Sections are loaded from disk once. Replacing a section goes through `write_text_to_markdown`,
+    so the intermediate files stay up to date for crash safety, and only that section's cached views
+    are invalidated.
+    """
+
+    def __init__(self, directory: str = './src/result/intermediate_results'):
+        self.directory = directory
+        self._markdown: Dict[str, str] = {}
+        self._text: Dict[str, str] = {}
+        self._context: Dict[str, SectionContext] = {}
+        self._lock = threading.Lock()
+
+    def load(self, filenames: List[str]) -> List[str]:
+        """Reads the given section files into memory and returns the filenames."""
+        for filename in filenames:
+            with open(filename, 'r', encoding='utf-8') as file:
+                markdown_string = file.read()
+            with self._lock:
+                self._markdown[filename] = markdown_string
+                self._invalidate(filename)
+        return filenames
+
+    def write(self, filename: str, text) -> str:
+        """Replaces a section, writing it through to disk, and returns the stored markdown."""
+        markdown_string = write_text_to_markdown(text, filename, directory=self.directory)
+        with self._lock:
+            self._markdown[filename] = markdown_string
+            self._invalidate(filename)
+        return markdown_string
+
+    def _invalidate(self, filename: str) -> None:
+        self._text.pop(filename, None)
+        self._context.pop(filename, None)
+
+    def markdown(self, filename: str) -> str:
+        """Returns the raw markdown of a section."""
+        with self._lock:
+            return self._markdown[filename]
+
+    def text(self, filename: str) -> str:
+        """Returns the plain text of a section, parsing the markdown only when it changed."""
+        with self._lock:
+            text = self._text.get(filename)
+            markdown_string = self._markdown[filename]
+        if text is None:
+            text = markdown_to_text(markdown_string)
+            with self._lock:
+                # Only cache the text if the section was not replaced in the meantime
+                if self._markdown.get(filename) is markdown_string:
+                    self._text[filename] = text
+        return text
+
+    def context(self, filename: str) -> SectionContext:
+        """Returns the full text, summary and heading of a section."""
+        with self._lock:
+            context = self._context.get(filename)
+            markdown_string = self._markdown[filename]
+        if context is None:
+            context = section_context(markdown_string, self.text(filename))
+            with self._lock:
+                if self._markdown.get(filename) is markdown_string:
+                    self._context[filename] = context
+        return context
+
+    def texts(self, filenames: List[str]) -> List[str]:
+        """Returns the plain text of several sections, in the given order."""
+        return [self.text(filename) for filename in filenames]
+
+    def clear(self) -> None:
+        """Forgets every section."""
+        with self._lock:
+            self._markdown.clear()
+            self._text.clear()
+            self._context.clear()
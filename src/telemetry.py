@@ -0,0 +1,230 @@
+# ./src/telemetry.py
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+def process_rss_mib() -> Optional[float]:
+    """Returns the resident memory of the process in MiB; where it cannot be read, the peak resident memory, or None."""
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RunReport:
+    """
+    Collects timing spans for the pipeline stages and LLM calls of one memo run.
+
+    Spans follow the OpenTelemetry span layout (trace and span ids, parent span, start and end in unix
+    nanoseconds, attributes and status), so the exported file can be loaded by tracing tools. Nesting is
+    tracked per thread: a span opened inside another span on the same thread becomes its child.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Dict[str, Any]] = []
+        self.memory: List[Dict[str, Any]] = []
+        self.overlaps: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> List[str]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str, **attributes):
+        """Times a pipeline stage. The yielded dict can be used to add attributes while the stage runs."""
+        stack = self._stack()
+        span_id = uuid.uuid4().hex[:16]
+        parent_span_id = stack[-1] if stack else None
+        stack.append(span_id)
+        start = time.time_ns()
+        status = "OK"
+        try:
+            yield attributes
+        except BaseException:
+            status = "ERROR"
+            raise
+        finally:
+            stack.pop()
+            self._add(name, span_id, parent_span_id, start, time.time_ns(), attributes, status)
+
+    def record_llm_call(self, agent: str, start: int, end: int, model: Optional[str] = None, prompt_tokens: int = 0, completion_tokens: int = 0, retries: int = 0, cache_hit: bool = False, error: Optional[str] = None, role: Optional[str] = None, fallbacks: int = 0) -> None:
+        """Records one LLM call; `start` and `end` are unix nanoseconds, `fallbacks` the models it moved past."""
+        stack = self._stack()
+        attributes = {
+            "agent": agent,
+            "role": role or agent,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "fallbacks": fallbacks,
+        }
+        if error:
+            attributes["error"] = error
+        self._add("llm.call", uuid.uuid4().hex[:16], stack[-1] if stack else None, start, end, attributes, "ERROR" if error else "OK")
+
+    def record_memory(self, section: str, **values) -> None:
+        """Records the resident memory of the process after a section, with `values` such as the size of the agents' histories."""
+        rss = process_rss_mib()
+        with self._lock:
+            self.memory.append({"section": section, "rss_mib": round(rss, 1) if rss is not None else None, **values})
+
+    def record_overlaps(self, section: str, stripped: int = 0, **values) -> None:
+        """Records the near-duplicate paragraphs of a section's latest version, and adds up the paragraphs stripped from all its versions."""
+        with self._lock:
+            row = self.overlaps.setdefault(section, {"stripped": 0})
+            row.update(values)
+            row["stripped"] += stripped
+
+    def _add(self, name, span_id, parent_span_id, start, end, attributes, status) -> None:
+        span = {
+            "name": name,
+            "trace_id": self.trace_id,
+            "span_id": span_id,
+            "parent_span_id": parent_span_id,
+            "start_time_unix_nano": start,
+            "end_time_unix_nano": end,
+            "attributes": dict(attributes),
+            "status": status,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Aggregates the spans per pipeline stage, per agent and per agent role, with the models each role used,
+        and lists the memory after every section and the near-duplicate paragraphs of every section.
+        """
+        stages = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+        agents = defaultdict(lambda: {"calls": 0, "cache_hits": 0, "errors": 0, "retries": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+        roles = defaultdict(lambda: {"calls": 0, "errors": 0, "fallbacks": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "models": {}})
+        with self._lock:
+            spans = list(self.spans)
+            memory = list(self.memory)
+            overlaps = {section: dict(values) for section, values in self.overlaps.items()}
+        for span in spans:
+            seconds = (span["end_time_unix_nano"] - span["start_time_unix_nano"]) / 1e9
+            attributes = span["attributes"]
+            if span["name"] == "llm.call":
+                row = agents[attributes["agent"]]
+                row["calls"] += 1
+                row["cache_hits"] += int(attributes["cache_hit"])
+                row["errors"] += int(span["status"] == "ERROR")
+                row["retries"] += attributes["retries"]
+                row["seconds"] += seconds
+                row["prompt_tokens"] += attributes["prompt_tokens"]
+                row["completion_tokens"] += attributes["completion_tokens"]
+                row = roles[attributes.get("role") or attributes["agent"]]
+                row["calls"] += 1
+                row["errors"] += int(span["status"] == "ERROR")
+                row["fallbacks"] += attributes.get("fallbacks", 0)
+                row["seconds"] += seconds
+                row["prompt_tokens"] += attributes["prompt_tokens"]
+                row["completion_tokens"] += attributes["completion_tokens"]
+                if attributes["model"]:
+                    row["models"][attributes["model"]] = row["models"].get(attributes["model"], 0) + 1
+            else:
+                stages[span["name"]]["count"] += 1
+                stages[span["name"]]["seconds"] += seconds
+        return {"run_id": self.run_id, "trace_id": self.trace_id, "stages": dict(stages), "agents": dict(agents), "roles": dict(roles), "memory": memory, "overlaps": overlaps}
+
+    def summary_table(self) -> str:
+        """Returns the summary as plain-text tables."""
+        summary = self.summary()
+        lines = [f"{'Stage':<28}{'Count':>8}{'Seconds':>12}"]
+        for name, row in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f"{name:<28}{row['count']:>8}{row['seconds']:>12.2f}")
+        lines.append("")
+        lines.append(f"{'Agent':<28}{'Calls':>8}{'Cached':>8}{'Errors':>8}{'Retries':>8}{'Seconds':>10}{'Avg s':>8}{'Prompt tok':>12}{'Compl tok':>11}")
+        for name, row in sorted(summary["agents"].items(), key=lambda item: -item[1]["seconds"]):
+            average = row["seconds"] / row["calls"] if row["calls"] else 0.0
+            lines.append(
+                f"{name:<28}{row['calls']:>8}{row['cache_hits']:>8}{row['errors']:>8}{row['retries']:>8}"
+                f"{row['seconds']:>10.2f}{average:>8.2f}{row['prompt_tokens']:>12}{row['completion_tokens']:>11}"
+            )
+        lines.append("")
+        lines.append(f"{'Role':<16}{'Calls':>8}{'Errors':>8}{'Fallback':>9}{'Avg s':>8}{'Prompt tok':>12}{'Compl tok':>11}  Models")
+        for name, row in sorted(summary["roles"].items(), key=lambda item: -item[1]["seconds"]):
+            average = row["seconds"] / row["calls"] if row["calls"] else 0.0
+            models = ", ".join(f"{model} ({calls})" for model, calls in row["models"].items())
+            lines.append(
+                f"{name:<16}{row['calls']:>8}{row['errors']:>8}{row['fallbacks']:>9}{average:>8.2f}"
+                f"{row['prompt_tokens']:>12}{row['completion_tokens']:>11}  {models}"
+            )
+        rss = [row["rss_mib"] for row in summary["memory"] if row["rss_mib"] is not None]
+        if rss:
+            kept = max(row.get("history_messages_kept", 0) for row in summary["memory"])
+            lines.append("")
+            lines.append(
+                f"Memory over {len(summary['memory'])} section chats: RSS {rss[0]:.1f} MiB after the first, {rss[-1]:.1f} MiB after the last, "
+                f"{max(rss):.1f} MiB at most; at most {kept} agent history messages kept between sections"
+            )
+        overlaps = summary["overlaps"].values()
+        if overlaps:
+            flagged = [row for row in overlaps if row["duplicates"]]
+            lines.append("")
+            lines.append(
+                f"Near-duplicate paragraphs: {sum(row['duplicates'] for row in overlaps)} of {sum(row['paragraphs'] for row in overlaps)} "
+                f"in {len(flagged)} of {len(overlaps)} sections, highest similarity {max(row['max_score'] for row in overlaps):.2f}; "
+                f"{sum(row.get('stripped', 0) for row in overlaps)} stripped"
+            )
+        return "\n".join(lines)
+
+    def save(self, directory: str, export_spans: bool = False) -> str:
+        """Writes `report.json`, and with `export_spans` every span to `spans.jsonl`, returning the report path."""
+        os.makedirs(directory, exist_ok=True)
+        report_path = os.path.join(directory, "report.json")
+        with open(report_path, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, indent=4)
+        if export_spans:
+            with self._lock:
+                spans = list(self.spans)
+            with open(os.path.join(directory, "spans.jsonl"), "w", encoding="utf-8") as file:
+                for span in spans:
+                    file.write(json.dumps(span) + "\n")
+        return report_path
+
+
+def instrument_method(obj, method_name: str, span_name: str, report: RunReport) -> None:
+    """Times every call of `obj.method_name` as a span of `report`. Calling it again only switches the report."""
+    method = getattr(obj, method_name)
+    if getattr(method, "_memogen_instrumented", False):
+        method.report = report
+        return
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        with timed.report.stage(span_name):
+            return method(*args, **kwargs)
+
+    timed._memogen_instrumented = True
+    timed.report = report
+    setattr(obj, method_name, timed)
+
+
+def log_summary(report: RunReport) -> None:
+    logging.info(f"Run report {report.run_id}:\n{report.summary_table()}")
@@ -0,0 +1,66 @@
+# ./src/transport.py
+
+from src.config import llm_http2, llm_http_max_connections, llm_http_max_keepalive_connections, llm_http_keepalive_expiry
+from typing import Any, Dict
+import atexit
+import functools
+import importlib.util
+import logging
+import threading
+
+_lock = threading.Lock()
+_http_client = None
+
+
+@functools.lru_cache(maxsize=None)
+def shared_client_class():
+    """
+    Returns a subclass of the httpx client whose copies are the client itself. The shared client is put in
+    llm_config entries as `http_client`, and autogen deep-copies llm_configs for every agent.
+    httpx is imported here, it takes longer to import than the rest of main.
+    """
+    import httpx
+
+    return type("SharedClient", (httpx.Client,), {"__deepcopy__": lambda self, memo: self})
+
+
+def http2_available() -> bool:
+    return llm_http2 and importlib.util.find_spec("h2") is not None
+
+
+def _client_settings() -> Dict[str, Any]:
+    if llm_http2 and not http2_available():
+        logging.info("The h2 package is not installed, LLM calls use HTTP/1.1 with keep-alive")
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=llm_http_max_connections,
+        max_keepalive_connections=llm_http_max_keepalive_connections,
+        keepalive_expiry=llm_http_keepalive_expiry,
+    )
+    # The OpenAI client sets the timeout of every request, as it does with its own HTTP client
+    return {"http2": http2_available(), "limits": limits, "follow_redirects": True}
+
+
+def http_client():
+    """Returns the pooled keep-alive HTTP client shared by every agent of the process."""
+    global _http_client
+    with _lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = shared_client_class()(**_client_settings())
+        return _http_client
+
+
+def uses_http_client(config: Dict[str, Any]) -> bool:
+    """Whether autogen builds an OpenAI or Azure OpenAI client for an llm_config entry, which can take the shared HTTP client."""
+    return config.get("model_client_cls") is None and not str(config.get("api_type") or "openai").startswith("google")
+
+
+@atexit.register
+def close() -> None:
+    """Closes the shared HTTP client and its connections."""
+    global _http_client
+    with _lock:
+        client, _http_client = _http_client, None
+    if client is not None:
+        client.close()
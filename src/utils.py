@@ -6,10 +6,17 @@ from docx import Document
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_LINE_SPACING, WD_BREAK  
 from docx.shared import Pt, Inches  
 from docx.oxml.ns import qn  
-from docx.oxml import OxmlElement  
+from docx.oxml import OxmlElement, parse_xml
 from docx.enum.style import WD_STYLE_TYPE  
 from docx.text.paragraph import Paragraph
-from typing import Optional,  Dict, List, Tuple
+from docx.oxml.table import CT_Tbl
+from docx.table import Table
+from docx.section import Section
+from typing import Optional,  Dict, List, NamedTuple, Tuple
+from src.context import count_tokens
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from lxml import etree
 import re  
 import os  
 import json  
@@ -24,6 +31,9 @@ def write_text_to_markdown(text, file_name, directory='./src/result/intermediate
         text (str): The raw text content to be written to the markdown file.
         file_name (str): The name of the markdown file.
         directory (str): The directory where the markdown file will be saved. Default is './output_folder'.
+
+    Returns:
+        str: The markdown text that was written.
     """
     # Ensure the directory exists
     os.makedirs(directory, exist_ok=True)
@@ -47,16 +57,89 @@ def write_text_to_markdown(text, file_name, directory='./src/result/intermediate
     
     print(f'Text has been written to {file_path}')
 
-def parse_markdown(markdown_str, output_folder="./src/result/intermediate_results"):  
-    """Parses a markdown string into several markdown strings divided by titles, then saves each text string as a separate markdown document in a folder."""  
-    title_pattern = re.compile(r'(#+\s.*\n)')  
-    matches = list(title_pattern.finditer(markdown_str))  
+    return text
+
+OUTLINE_HEADING = re.compile(r'^(#+)\s.*$\n?', re.MULTILINE)
+
+
+class OutlineNode(NamedTuple):
+    """A heading of an outline with its text up to the next heading, and the headings nested under it."""
+    level: int
+    markdown: str
+    children: List["OutlineNode"]
+
+
+def parse_outline_tree(markdown_str: str) -> List[OutlineNode]:
+    """Parses a markdown outline into a tree of headings; text before the first heading is dropped."""
+    matches = list(OUTLINE_HEADING.finditer(markdown_str))
+    roots: List[OutlineNode] = []
+    stack: List[OutlineNode] = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(markdown_str)
+        node = OutlineNode(len(match.group(1)), markdown_str[match.start():end], [])
+        while stack and stack[-1].level >= node.level:
+            stack.pop()
+        (stack[-1].children if stack else roots).append(node)
+        stack.append(node)
+    return roots
+
+
+def outline_subtree(node: OutlineNode) -> str:
+    """Returns the markdown of a heading and everything nested under it."""
+    return node.markdown + "".join(outline_subtree(child) for child in node.children)
+
+
+def outline_work_units(nodes: List[OutlineNode], min_tokens: int, max_tokens: int) -> List[str]:
+    """
+    Groups the headings of an outline into work units of roughly `min_tokens` to `max_tokens` outline tokens.
+
+    A heading is kept together with everything nested under it when that fits in `max_tokens`; otherwise its own
+    text becomes a unit and its sub-headings are grouped the same way. Consecutive units smaller than
+    `min_tokens` are merged while they fit, except into the first unit of the outline, the memo's introduction.
+    A single top-level heading is the memo's title and is always split into its introduction and sub-headings.
+    """
+    def group(nodes, merge_into_first):
+        units = []
+        for node in nodes:
+            subtree = outline_subtree(node)
+            if not node.children or count_tokens(subtree) <= max_tokens:
+                parts = [subtree]
+            else:
+                parts = [node.markdown] + group(node.children, True)
+            for part in parts:
+                previous = count_tokens(units[-1]) if units else None
+                if previous is not None and previous < min_tokens and previous + count_tokens(part) <= max_tokens and (len(units) > 1 or merge_into_first):
+                    units[-1] += part
+                else:
+                    units.append(part)
+        return units
+
+    if len(nodes) == 1 and nodes[0].children:
+        return [nodes[0].markdown] + group(nodes[0].children, True)
+    return group(nodes, False)
+
+
+def parse_markdown(markdown_str, output_folder="./src/result/intermediate_results", max_unit_tokens=None, min_unit_tokens=0):  
+    """
+    Parses a markdown string into several markdown strings divided by titles, then saves each text string as a separate markdown document in a folder.
+
+    Without `max_unit_tokens` every heading becomes its own section. With it, the outline is parsed into a tree
+    and sub-headings are grouped with their parent into sections of `min_unit_tokens` to `max_unit_tokens`
+    tokens, see outline_work_units; the sub-headings stay in the section's markdown.
+    """  
+    if max_unit_tokens is not None:
+        sections = outline_work_units(parse_outline_tree(markdown_str), min_unit_tokens, max_unit_tokens)
+    else:
+        title_pattern = re.compile(r'(#+\s.*\n)')  
+        matches = list(title_pattern.finditer(markdown_str))  
+        sections = []
+        for i in range(len(matches)):  
+            start_pos = matches[i].start()  
+            end_pos = matches[i + 1].start() if i + 1 < len(matches) else len(markdown_str)  
+            sections.append(markdown_str[start_pos:end_pos])
     os.makedirs(output_folder, exist_ok=True)  
     filenames = []  
-    for i in range(len(matches)):  
-        start_pos = matches[i].start()  
-        end_pos = matches[i + 1].start() if i + 1 < len(matches) else len(markdown_str)  
-        section_str = markdown_str[start_pos:end_pos]  
+    for i, section_str in enumerate(sections):  
         filename = os.path.join(output_folder, f'section_{i + 1}.md')  
         with open(filename, 'w', encoding='utf-8') as f:  
             f.write(section_str)  
@@ -77,6 +160,18 @@ def read_markdown_file_to_text(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         markdown_string = file.read()
 
+    return markdown_to_text(markdown_string)
+
+def markdown_to_text(markdown_string):
+    """
+    Converts a markdown string to its raw text content.
+
+    Args:
+        markdown_string (str): The markdown content.
+
+    Returns:
+        str: The raw text content extracted from the markdown.
+    """
     # Convert markdown to HTML
     html = markdown(markdown_string)
     
@@ -88,6 +183,29 @@ def read_markdown_file_to_text(file_path):
 
 
 
+def read_jobs_from_jsonl(file_path):
+    """
+    Reads memo jobs from a JSONL file, one {"topic", "audience", "memo_type"} object per line.
+
+    Args:
+        file_path (str): The path to the JSONL file.
+
+    Returns:
+        list: The jobs, in file order.
+    """
+    jobs = []
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            missing = [key for key in ("topic", "audience", "memo_type") if not job.get(key)]
+            if missing:
+                raise ValueError(f"Job on line {line_number} of {file_path} is missing: {', '.join(missing)}")
+            jobs.append(job)
+    return jobs
+
+
 def clear_previous_results(intermediate_results_directory, final_result_path):  
     """Remove all files in the intermediate results directory and the final result file if they exist."""  
     try:  
@@ -101,99 +219,266 @@ def clear_previous_results(intermediate_results_directory, final_result_path):
         logging.error(f"Error clearing previous results: {e}")  
 
 
-def markdown_to_docx_format(markdown_text: str, doc: Document) -> None:  
-    """Converts markdown content to a python-docx document."""  
-    try:  
-        header_map = {  
-            'h1': 0,  
-            'h2': 1,  
-            'h3': 2,  
-            'h4': 3,  
-            'h5': 4,  
-            'h6': 5  
-        }  
-  
-        def add_styled_text(paragraph, text):  
-            """Add styled text (bold, italic, code) to a paragraph."""  
-            parts = re.split(r'(\*\*.*?\*\*|\*.*?\*|`.*?`)', text)  
-            for part in parts:  
-                if part.startswith('**') and part.endswith('**'):  
-                    run = paragraph.add_run(part[2:-2])  
-                    run.bold = True  
-                elif part.startswith('*') and part.endswith('*'):  
-                    run = paragraph.add_run(part[1:-1])  
-                    run.italic = True  
-                elif part.startswith('`') and part.endswith('`'):  
-                    run = paragraph.add_run(part[1:-1])  
-                    run.font.name = 'Courier New'  
-                else:  
-                    paragraph.add_run(part)  
-  
-        list_stack = []  
-        current_list_type = None  
-        lines = markdown_text.split('\n')  
-  
-        for line in lines:  
-            if re.match(r'#+\s', line):  
-                # Check for headers  
-                match = re.match(r'^(#+)\s+(.*)', line)  
-                if match:  
-                    header_level = len(match.group(1))  
-                    header_text = match.group(2)  
-                    doc.add_heading(header_text.strip(), level=header_map.get(f'h{header_level}', 1))  
-            elif line.startswith('```') and line.endswith('```'):  
-                # Check for code blocks  
-                code_text = line.strip('```').strip()  
-                doc.add_paragraph(code_text, style='Quote')  
-            elif line.startswith('- '):  
-                # Handle unordered list  
-                if current_list_type != 'ul':  
-                    current_list_type = 'ul'  
-                    list_stack.append(current_list_type)  
-                paragraph = doc.add_paragraph(line[2:].strip(), style='List Bullet')  
-            elif re.match(r'^\d+\.', line):  
-                # Handle ordered list  
-                if current_list_type != 'ol':  
-                    current_list_type = 'ol'  
-                    list_stack.append(current_list_type)  
-                paragraph = doc.add_paragraph(line.strip(), style='List Number')  
-            elif '|' in line and '-' not in line:  
-                # Handle table rows  
-                cells = [cell.strip() for cell in line.split('|') if cell.strip()]  
-                if not hasattr(doc, '_current_table'):  
-                    doc._current_table = doc.add_table(rows=1, cols=len(cells))  
-                    doc._current_table.style = 'Table Grid'  
-                    hdr_cells = doc._current_table.rows[0].cells  
-                    for i, cell in enumerate(cells):  
-                        hdr_cells[i].text = cell  
-                else:  
-                    row_cells = doc._current_table.add_row().cells  
-                    for i, cell in enumerate(cells):  
-                        row_cells[i].text = cell  
-            else:  
-                # Handle normal paragraphs  
-                paragraph = doc.add_paragraph()  
-                add_styled_text(paragraph, line.strip())  
-  
-        if hasattr(doc, '_current_table'):  
-            del doc._current_table  
-  
-    except Exception as e:  
-        print(f"An error occurred while converting markdown to docx format: {e}")  
-  
-def markdown_to_docx(markdown_directory: str = "./src/result/intermediate_results", docx_save_path: str = "./src/result/result.docx"):  
-    """Iterates over each markdown file in a directory, converts them to a single string with python-docx compatible formatting, and writes them to a .docx file."""  
-    if not os.path.isdir(markdown_directory):  
-        raise ValueError(f"The specified directory does not exist: {markdown_directory}")  
-  
+# Block-level markdown, matched once per line
+# A closing sequence of #s only counts after whitespace, as in CommonMark, so "C#" keeps its #
+HEADING_LINE = re.compile(r'^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$')
+FENCE_LINE = re.compile(r'^\s*(```|~~~)')
+LIST_ITEM_LINE = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+QUOTE_LINE = re.compile(r'^\s*>\s?(.*)$')
+RULE_LINE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+# Characters XML 1.0 does not allow, which LLM output sometimes contains and python-docx refuses
+XML_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+TABLE_SEPARATOR_LINE = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+# Inline markdown: bold italic, bold, italic, code and links, in one alternation
+INLINE_PATTERN = re.compile(r'\*\*\*(.+?)\*\*\*|\*\*(.+?)\*\*|__(.+?)__|\*(.+?)\*|(?<!\w)_(.+?)_(?!\w)|`(.+?)`|\[([^\]]+)\]\([^)]*\)')
+HEADING_STYLES = {1: 'Title', 2: 'Heading 1', 3: 'Heading 2', 4: 'Heading 3', 5: 'Heading 4', 6: 'Heading 5'}
+MAX_LIST_LEVEL = 3
+# Fewer sections per process are converted faster in this process than a pool starts up
+PARALLEL_DOCX_MIN_SECTIONS = 32
+
+
+def add_text_run(paragraph, text):
+    """Adds a run of single-line text to a paragraph, without python-docx translating it character by character."""
+    run = paragraph.add_run()
+    run._r.add_t(text)
+    return run
+
+
+def add_styled_runs(paragraph, text):
+    """Adds text to a paragraph as runs, bold, italic or in a code font where the markdown says so."""
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        if match.start() > position:
+            add_text_run(paragraph, text[position:match.start()])
+        bold_italic, bold, bold_underscore, italic, italic_underscore, code, link = match.groups()
+        if bold_italic is not None:
+            run = add_text_run(paragraph, bold_italic)
+            run.bold = True
+            run.italic = True
+        elif bold is not None or bold_underscore is not None:
+            run = add_text_run(paragraph, bold if bold is not None else bold_underscore)
+            run.bold = True
+        elif italic is not None or italic_underscore is not None:
+            run = add_text_run(paragraph, italic if italic is not None else italic_underscore)
+            run.italic = True
+        elif code is not None:
+            run = add_text_run(paragraph, code)
+            run.font.name = 'Courier New'
+        else:
+            add_text_run(paragraph, link)
+        position = match.end()
+    if position < len(text):
+        add_text_run(paragraph, text[position:])
+
+
+def split_table_row(line):
+    return [cell.strip() for cell in line.strip().strip('|').split('|')]
+
+
+def markdown_to_docx_format(markdown_text: str, doc: Document) -> None:
+    """
+    Converts markdown content to a python-docx document in a single pass over its lines.
+
+    Handles headings, paragraphs, bold, italic and code spans, links, nested bullet and numbered lists,
+    block quotes, fenced code blocks and tables. Every block is appended to the document as soon as it ends,
+    so only the block being read is held in memory.
+
+    Args:
+        markdown_text (str): The markdown content.
+        doc (Document): The document the content is appended to.
+    """
+    markdown_text = XML_INVALID_CHARS.sub('', markdown_text)
+    body = doc.element.body
+    section_properties = body.sectPr
+    # doc.sections searches the whole body for section properties, once per call
+    last_section = Section(section_properties, doc.part) if section_properties is not None else doc.sections[-1]
+    table_width = last_section.page_width - last_section.left_margin - last_section.right_margin
+    style_ids = {}
+
+    def style_id(style):
+        # Looking styles up by name scans the whole styles part, so every style is looked up once
+        if style not in style_ids:
+            style_ids[style] = doc.styles[style].style_id
+        return style_ids[style]
+
+    def append(element):
+        # Inserting right before the section properties avoids python-docx searching the body for them every time
+        if section_properties is not None:
+            section_properties.addprevious(element)
+        else:
+            body.append(element)
+
+    def add_paragraph(style=None):
+        p = OxmlElement('w:p')
+        append(p)
+        if style is not None:
+            p.style = style_id(style)
+        return Paragraph(p, doc._body)
+
+    def add_table(rows):
+        # Document.add_table measures the page width from the whole body, once per table
+        tbl = CT_Tbl.new_tbl(len(rows), max(len(row) for row in rows), table_width)
+        append(tbl)
+        tbl.tblPr.style = style_id('Table Grid')
+        table = Table(tbl, doc._body)
+        for table_row, cells in zip(table.rows, rows):
+            for cell, text in zip(table_row.cells, cells):
+                add_styled_runs(cell.paragraphs[0], text)
+
+    paragraph_lines = []
+    quote_lines = []
+    table_rows = []
+    code_lines = None
+    list_indents = []
+    list_item = None
+
+    def flush():
+        nonlocal list_item
+        if paragraph_lines:
+            add_styled_runs(add_paragraph(), ' '.join(paragraph_lines))
+            paragraph_lines.clear()
+        if quote_lines:
+            add_styled_runs(add_paragraph('Quote'), ' '.join(quote_lines))
+            quote_lines.clear()
+        if table_rows:
+            add_table(table_rows)
+            table_rows.clear()
+        list_item = None
+        list_indents.clear()
+
+    for line in markdown_text.splitlines():
+        if code_lines is not None:
+            if FENCE_LINE.match(line):
+                run = add_paragraph('Quote').add_run('\n'.join(code_lines))
+                run.font.name = 'Courier New'
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+
+        stripped = line.strip()
+        if not stripped:
+            flush()
+            continue
+
+        if FENCE_LINE.match(line):
+            flush()
+            code_lines = []
+            continue
+
+        match = HEADING_LINE.match(line)
+        if match:
+            flush()
+            add_styled_runs(add_paragraph(HEADING_STYLES[len(match.group(1))]), match.group(2))
+            continue
+
+        if '|' in stripped:
+            separator = TABLE_SEPARATOR_LINE.match(stripped)
+            if separator and table_rows:
+                continue
+            # A table starts at a header row with a leading pipe; a separator under prose stays text
+            if table_rows or (stripped.startswith('|') and not separator):
+                if not table_rows:
+                    flush()
+                table_rows.append(split_table_row(stripped))
+                continue
+        if table_rows:
+            flush()
+
+        if RULE_LINE.match(line):
+            flush()
+            continue
+
+        match = LIST_ITEM_LINE.match(line)
+        if match:
+            if paragraph_lines or quote_lines:
+                flush()
+            indent = len(match.group(1).expandtabs(4))
+            while list_indents and indent < list_indents[-1]:
+                list_indents.pop()
+            if not list_indents or indent > list_indents[-1]:
+                list_indents.append(indent)
+            level = min(len(list_indents), MAX_LIST_LEVEL)
+            style = 'List Bullet' if match.group(2) in ('-', '*', '+') else 'List Number'
+            list_item = add_paragraph(style if level == 1 else f'{style} {level}')
+            add_styled_runs(list_item, match.group(3))
+            continue
+
+        if list_item is not None and line[:1].isspace():
+            # Indented lines continue the list item above them
+            add_styled_runs(list_item, ' ' + stripped)
+            continue
+
+        match = QUOTE_LINE.match(line)
+        if match:
+            if paragraph_lines or list_item is not None:
+                flush()
+            quote_lines.append(match.group(1).strip())
+            continue
+
+        if quote_lines or list_item is not None:
+            flush()
+        paragraph_lines.append(stripped)
+
+    if code_lines is not None:
+        # An unterminated fence runs to the end of the text
+        run = add_paragraph('Quote').add_run('\n'.join(code_lines))
+        run.font.name = 'Courier New'
+    flush()
+
+
+def section_sort_key(filename: str):
+    """Sorts section files by their number, so section_10.md comes after section_2.md."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', os.path.basename(filename))]
+
+
+def markdown_files_to_docx_xml(filepaths: List[str]) -> bytes:
+    """Converts markdown files, in order, to the XML of their document body, to be merged into a document built elsewhere."""
+    doc = Document()
+    for filepath in filepaths:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            markdown_to_docx_format(file.read(), doc)
+    body = doc.element.body
+    body.remove(body.sectPr)
+    return etree.tostring(body)
+
+
+def markdown_to_docx(markdown_directory: str = "./src/result/intermediate_results", docx_save_path: str = "./src/result/result.docx", filenames: Optional[List[str]] = None, max_workers: Optional[int] = None):  
+    """
+    Converts markdown section files to a single .docx file, in order.
+
+    The sections are taken from `filenames`, such as the list returned by parse_markdown, or else every .md file
+    of the directory by section number. Large memos are converted in a pool of processes, in contiguous chunks
+    of sections that are merged back in order. The document is written to a temporary file that then replaces
+    `docx_save_path`, so readers never see a partial document.
+
+    Args:
+        max_workers (int): Processes converting sections; None uses every CPU, 1 converts in this process.
+    """
+    if filenames is None:
+        if not os.path.isdir(markdown_directory):  
+            raise ValueError(f"The specified directory does not exist: {markdown_directory}")  
+        filenames = sorted(glob.glob(os.path.join(markdown_directory, '*.md')), key=section_sort_key)
+
     doc = Document()  
-  
-    for filename in os.listdir(markdown_directory):  
-        if filename.endswith('.md'):  
-            filepath = os.path.join(markdown_directory, filename)  
-            with open(filepath, 'r', encoding='utf-8') as file:  
-                markdown_text = file.read()  
-            markdown_to_docx_format(markdown_text, doc)  
-  
-    doc.save(docx_save_path)  
+    workers = min(max_workers or os.cpu_count() or 1, len(filenames) // PARALLEL_DOCX_MIN_SECTIONS)
+    if workers <= 1:
+        for filepath in filenames:
+            with open(filepath, 'r', encoding='utf-8') as file:
+                markdown_to_docx_format(file.read(), doc)
+    else:
+        # A few chunks per process balance the load without creating a document per section
+        chunk_size = -(-len(filenames) // (workers * 4))
+        chunks = [filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size)]
+        section_properties = doc.element.body.sectPr
+        # Spawned, not forked: the parent runs section workers, batch jobs and HTTP and sqlite threads whose
+        # locks a forked child could inherit while they are held
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            for xml in executor.map(markdown_files_to_docx_xml, chunks):
+                for element in list(parse_xml(xml)):
+                    section_properties.addprevious(element)
+
+    temporary_path = f"{docx_save_path}.tmp"
+    doc.save(temporary_path)
+    os.replace(temporary_path, docx_save_path)
     print(f"Combined document saved at: {docx_save_path}")  
\ No newline at end of file
@@ -0,0 +1,28 @@
+# ./tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# The model is chosen when src.config is first imported, so every test runs against the offline mock backend
+os.environ.setdefault("MEMOGEN_MOCK_LLM", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeEmbeddingFunction:
+    """Embeds texts without downloading the default Chroma model."""
+
+    def __call__(self, input):
+        return [[float(len(text) % 7), 1.0] for text in input]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    """An agent registry whose Teachability memos live in a temporary directory."""
+    from src.memo_store import CachedEmbeddingFunction
+    from src.registry import AgentRegistry
+
+    registry = AgentRegistry(memo_db_path=str(tmp_path / "memos"))
+    registry._embedding_function = CachedEmbeddingFunction(FakeEmbeddingFunction())
+    return registry
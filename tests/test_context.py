@@ -0,0 +1,74 @@
+# ./tests/test_context.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import context
+from src.context import budget_neighbour_context, count_tokens, section_context
+
+
+@pytest.fixture(autouse=True)
+def offline_token_counts(monkeypatch):
+    # Counts tokens the way offline runs do when tiktoken cannot load its vocabularies
+    monkeypatch.setattr(context, "_encoding", lambda model: None)
+
+
+def make_section(number, words=80):
+    body = " ".join(f"point{number}" for _ in range(words))
+    return section_context(f"## Section {number}\n\n{body}\n", f"Section {number} {body}")
+
+
+def spent(contexts, content):
+    """Tokens of the views of `contexts` that make up a neighbour context."""
+    pieces = content.split("\n\n") if content else []
+    total = 0
+    for piece in pieces:
+        views = [view for section in contexts for view in section[:3] if view == piece]
+        assert views, f"{piece!r} is not a view of any section"
+        total += count_tokens(views[0])
+    return total
+
+
+def test_count_tokens_falls_back_to_four_characters_per_token():
+    assert count_tokens("") == 0
+    assert count_tokens("abcd") == 1
+    assert count_tokens("abcde") == 2
+
+
+@pytest.mark.parametrize("budget", [0, 5, 40, 150, 300, 600, 10000])
+def test_budget_is_honoured(budget):
+    previous = [make_section(number) for number in range(1, 4)]
+    following = [make_section(number) for number in range(5, 8)]
+    previous_content, next_content = budget_neighbour_context(previous, following, budget)
+    assert spent(previous, previous_content) + spent(following, next_content) <= budget
+
+
+def test_nearest_neighbours_are_kept_first():
+    previous = [make_section(number) for number in range(1, 4)]
+    following = [make_section(number) for number in range(5, 8)]
+    text_tokens = previous[-1].tokens()[0]
+    heading_tokens = sum(section.tokens()[2] for section in previous + following)
+    # Room for every heading and one full text, which goes to the section just before the focus section
+    previous_content, next_content = budget_neighbour_context(previous, following, heading_tokens + text_tokens)
+    assert previous_content.split("\n\n") == [previous[0].heading, previous[1].heading, previous[2].text]
+    assert next_content.split("\n\n") == [section.heading for section in following]
+
+
+def test_summary_replaces_a_text_that_does_not_fit():
+    previous = [make_section(1, words=400)]
+    following = [make_section(2, words=400)]
+    budget = sum(section.tokens()[1] for section in previous + following)
+    previous_content, next_content = budget_neighbour_context(previous, following, budget)
+    assert (previous_content, next_content) == (previous[0].summary, following[0].summary)
+
+
+def test_everything_fits_a_large_budget():
+    previous = [make_section(1)]
+    following = [make_section(2), make_section(3)]
+    previous_content, next_content = budget_neighbour_context(previous, following, 10000)
+    assert previous_content == previous[0].text
+    assert next_content == "\n\n".join(section.text for section in following)
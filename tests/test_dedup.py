@@ -0,0 +1,55 @@
+# ./tests/test_dedup.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.dedup import DuplicateIndex, signature, similarity, strip_paragraphs
+
+BUDGET = "The committee reviewed the quarterly budget and agreed that travel spending should be cut by ten percent before the end of the fiscal year."
+# The same paragraph with one word changed, an estimated Jaccard similarity of about 0.6
+BUDGET_REWORDED = "The committee reviewed the quarterly budget and agreed that travel spending should be reduced by ten percent before the end of the fiscal year."
+HIRING = "Our hiring plan adds two engineers to the platform team in the spring, with interviews starting once the new office lease is signed."
+OFFICE = "The new office is closer to the train station, so the team expects shorter commutes and more people choosing to work on site."
+
+
+def test_near_duplicate_paragraph_is_flagged():
+    index = DuplicateIndex(threshold=0.5)
+    index.update("1.md", f"# Budget\n\n{BUDGET}\n\n{HIRING}\n")
+    index.update("2.md", f"# Plans\n\n{OFFICE}\n\n{BUDGET_REWORDED}\n")
+    overlaps = index.overlaps("2.md")
+    assert [(overlap.paragraph, overlap.other_section, overlap.other_paragraph) for overlap in overlaps] == [(BUDGET_REWORDED, "1.md", BUDGET)]
+    assert overlaps[0].score >= 0.5
+
+
+def test_near_duplicate_paragraph_is_stripped():
+    markdown_string = f"# Plans\n\n{OFFICE}\n\n{BUDGET_REWORDED}\n\n- {HIRING}\n"
+    assert strip_paragraphs(markdown_string, [BUDGET_REWORDED]) == f"# Plans\n\n{OFFICE}\n\n- {HIRING}\n"
+
+
+def test_distinct_paragraphs_are_kept():
+    index = DuplicateIndex(threshold=0.5)
+    index.update("1.md", f"{BUDGET}\n\n{HIRING}\n")
+    index.update("2.md", f"{OFFICE}\n")
+    assert index.overlaps("1.md") == []
+    assert index.overlaps("2.md") == []
+    assert index.scores()["1.md"] == {"paragraphs": 2, "duplicates": 0, "overlap": 0.0, "max_score": 0.0}
+
+
+def test_threshold_is_respected():
+    score = similarity(signature(BUDGET), signature(BUDGET_REWORDED))
+    assert 0.5 <= score < 0.9
+    for threshold, expected in ((score, 1), (0.9, 0)):
+        index = DuplicateIndex(threshold=threshold)
+        index.update("1.md", BUDGET)
+        index.update("2.md", BUDGET_REWORDED)
+        assert len(index.overlaps("2.md")) == expected
+
+
+def test_replaced_section_is_reindexed():
+    index = DuplicateIndex(threshold=0.5)
+    index.update("1.md", BUDGET)
+    index.update("2.md", BUDGET_REWORDED)
+    index.update("2.md", OFFICE)
+    assert index.overlaps("1.md") == []
@@ -0,0 +1,76 @@
+# ./tests/test_llm_cache.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import llm_cache
+from src.llm_cache import ResponseCache, open_response_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Current time of the cache, advanced by the tests."""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_their_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+    cache.set("prompt", {"content": "answer"})
+    clock[0] += 59
+    assert cache.get("prompt") == {"content": "answer"}
+    clock[0] += 2
+    assert cache.get("prompt") is None
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("first", 1)
+    clock[0] += 1
+    cache.set("second", 2)
+    clock[0] += 1
+    # Reading the first entry makes the second the least recently used
+    assert cache.get("first") == 1
+    clock[0] += 1
+    cache.set("third", 3)
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_read_only_cache_serves_entries_without_writing(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    writer = ResponseCache(path, mode="read-write", ttl_seconds=60)
+    writer.set("prompt", "answer")
+    writer.close()
+
+    reader = ResponseCache(path, mode="read-only", ttl_seconds=60)
+    assert reader.get("prompt") == "answer"
+    assert reader.last_lookup_hit
+    reader.set("other", "ignored")
+    assert reader.get("other") is None
+    assert not reader.last_lookup_hit
+    # An expired entry is missed but left in place for read-write runs to evict
+    clock[0] += 61
+    assert reader.get("prompt") is None
+    assert reader.stats() == {"mode": "read-only", "hits": 1, "misses": 2, "hit_rate": 1 / 3, "writes": 0, "evictions": 0}
+    reader.close()
+    (count,) = ResponseCache(path, mode="read-only")._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+    assert count == 1
+
+
+def test_cache_modes():
+    assert open_response_cache("off", "unused.sqlite") is None
+    with pytest.raises(ValueError):
+        open_response_cache("write-only", "unused.sqlite")
+    with pytest.raises(ValueError):
+        ResponseCache("unused.sqlite", mode="off")
@@ -0,0 +1,76 @@
+# ./tests/test_markdown_to_docx.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+
+from src.utils import markdown_to_docx_format
+
+
+def convert(markdown_text):
+    doc = Document()
+    markdown_to_docx_format(markdown_text, doc)
+    return doc
+
+
+def paragraphs(doc):
+    return [(paragraph.style.name, paragraph.text) for paragraph in doc.paragraphs]
+
+
+def test_headings_keep_trailing_hashes_that_are_text():
+    doc = convert("# Memo\n## Use of C# ##\n### Results in F#\n")
+    assert paragraphs(doc) == [("Title", "Memo"), ("Heading 1", "Use of C#"), ("Heading 2", "Results in F#")]
+
+
+def test_nested_lists_use_level_styles():
+    doc = convert("- first\n  - second\n    - third\n1. one\n   2. two\n")
+    assert paragraphs(doc) == [
+        ("List Bullet", "first"),
+        ("List Bullet 2", "second"),
+        ("List Bullet 3", "third"),
+        ("List Number", "one"),
+        ("List Number 2", "two"),
+    ]
+
+
+def test_fenced_code_is_kept_verbatim():
+    doc = convert("Before\n```python\n# not a heading\n| not | a table |\n```\nAfter\n")
+    assert paragraphs(doc) == [("Normal", "Before"), ("Quote", "# not a heading\n| not | a table |"), ("Normal", "After")]
+    assert doc.paragraphs[1].runs[0].font.name == "Courier New"
+
+
+def test_tables_need_a_header_row():
+    doc = convert("| Name | Value |\n|---|---|\n| a | 1 |\n| b | 2 |\n")
+    assert len(doc.tables) == 1
+    assert [[cell.text for cell in row.cells] for row in doc.tables[0].rows] == [["Name", "Value"], ["a", "1"], ["b", "2"]]
+
+
+def test_prose_above_a_separator_is_not_a_table():
+    doc = convert("Some prose line\n|---|---|\n")
+    assert doc.tables == []
+    assert paragraphs(doc) == [("Normal", "Some prose line |---|---|")]
+
+
+def test_inline_markup_becomes_run_formatting():
+    doc = convert("Plain **bold** *italic* `code` and [a link](https://example.com).\n")
+    runs = [(run.text, run.bold, run.italic, run.font.name) for run in doc.paragraphs[0].runs]
+    assert runs == [
+        ("Plain ", None, None, None),
+        ("bold", True, None, None),
+        (" ", None, None, None),
+        ("italic", None, True, None),
+        (" ", None, None, None),
+        ("code", None, None, "Courier New"),
+        (" and ", None, None, None),
+        ("a link", None, None, None),
+        (".", None, None, None),
+    ]
+
+
+def test_control_characters_are_stripped():
+    doc = convert("# Ti\x00tle\nText with\x08 a \x0bbell\x07.\n| a\x1f | b |\n|---|---|\n")
+    assert paragraphs(doc)[:2] == [("Title", "Title"), ("Normal", "Text with a bell.")]
+    assert doc.tables[0].rows[0].cells[0].text == "a"
@@ -0,0 +1,57 @@
+# ./tests/test_reviews.py
+
+import io
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.reviews import extract_review, structured_review_summary
+
+
+class Recipient:
+    name = "Layman Reviewer"
+
+    def __init__(self, content):
+        self.content = content
+
+    def last_message(self, sender):
+        return {"content": self.content, "role": "assistant"}
+
+
+def test_review_object_is_read_from_a_code_fence():
+    text = 'Here is my review:\n```json\n{"Reviewer": "Financial Reviewer", "Review": "Cite the revenue source."}\n```'
+    assert extract_review(text, "Layman Reviewer") == {"Reviewer": "Financial Reviewer", "Review": "Cite the revenue source."}
+
+
+def test_review_object_is_read_as_a_python_dict():
+    text = "{'Review': 'Define the acronyms.'}"
+    assert extract_review(text, "Layman Reviewer") == {"Reviewer": "Layman Reviewer", "Review": "Define the acronyms."}
+
+
+def test_plain_review_is_kept_without_its_terminate_marker():
+    text = "The second paragraph repeats the first {see above}.\nTERMINATE"
+    assert extract_review(text, "Quality Assurance Reviewer") == {"Reviewer": "Quality Assurance Reviewer", "Review": "The second paragraph repeats the first {see above}."}
+
+
+def test_summary_is_the_reviewer_message_as_json():
+    summary = structured_review_summary(None, Recipient("Shorter sentences, please."), {})
+    assert json.loads(summary) == {"Reviewer": "Layman Reviewer", "Review": "Shorter sentences, please."}
+    summary = structured_review_summary(None, Recipient("Fine."), {"reviewer": "Financial Reviewer"})
+    assert json.loads(summary)["Reviewer"] == "Financial Reviewer"
+
+
+def test_reviews_are_summarized_without_llm_calls(registry):
+    import main
+
+    memo = main.AutoMemoProduction("Quarterly results", "Investors", "Financial", agents=registry, runs_directory=os.path.join(registry.memo_db_path, "runs"), docx_path=None)
+    with registry.use("team", "Investors", "Financial") as team:
+        memo.prepare_team(team)
+        with redirect_stdout(io.StringIO()):
+            team.review_section("# Costs\n\nCosts rose by ten percent.\n")
+    calls = memo.report.summary()["agents"]
+    # One call per reviewer; a reflection_with_llm summary would be a second call of each reviewer chat
+    for reviewer in ("Layman Reviewer", "Financial Reviewer", "Quality Assurance Reviewer", "Meta Reviewer"):
+        assert calls[reviewer]["calls"] == 1
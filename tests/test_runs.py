@@ -0,0 +1,100 @@
+# ./tests/test_runs.py
+
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+OUTLINE = "# Memo\n\nIntroduction.\n\n## Market\n\nThe market.\n\n## Costs\n\nThe costs.\n\n## Outlook\n\nThe outlook.\n"
+PROFILE = ("Investors", "Financial")
+
+
+def producer(tmp_path, registry, **kwargs):
+    kwargs.setdefault("agent_profile", PROFILE)
+    return main.AutoMemoProduction(
+        topic="Quarterly results",
+        audience=PROFILE[0],
+        memo_type=PROFILE[1],
+        max_concurrency=1,
+        runs_directory=str(tmp_path / "runs"),
+        agents=registry,
+        docx_path=None,
+        unit_tokens=(0, None),
+        **kwargs,
+    )
+
+
+def run(memo):
+    with redirect_stdout(io.StringIO()):
+        return memo.run()
+
+
+def llm_calls(memo):
+    return sum(agent["calls"] for agent in memo.report.summary()["agents"].values())
+
+
+def test_resume_after_a_failure_skips_completed_sections(tmp_path, registry):
+    memo = producer(tmp_path, registry)
+    memo.manifest.set_outline(OUTLINE)
+    write_section = memo.write_section
+    written = []
+
+    def failing_write_section(team, filename, message, state, refinement=0):
+        if len(written) == 2:
+            raise RuntimeError("injected failure")
+        written.append(filename)
+        return write_section(team, filename, message, state, refinement)
+
+    memo.write_section = failing_write_section
+    with pytest.raises(RuntimeError, match="injected failure"):
+        run(memo)
+    assert [memo.manifest.state(filename) for filename in memo.manifest.filenames] == ["drafted", "drafted", "outlined", "outlined"]
+
+    resumed = main.AutoMemoProduction.resume(memo.run_id, runs_directory=str(tmp_path / "runs"), agents=registry, docx_path=None)
+    write_section = resumed.write_section
+    drafted = []
+
+    def recording_write_section(team, filename, message, state, refinement=0):
+        if not refinement and state == "drafted":
+            drafted.append(filename)
+        return write_section(team, filename, message, state, refinement)
+
+    resumed.write_section = recording_write_section
+    docx_path = run(resumed)
+    assert os.path.exists(docx_path)
+    assert all(resumed.manifest.reached(filename, "refined") for filename in resumed.manifest.filenames)
+    # The drafts written before the failure are refined, not drafted again
+    assert drafted == resumed.manifest.filenames[2:]
+
+
+def test_from_run_reuses_unchanged_sections_without_llm_calls(tmp_path, registry):
+    first = producer(tmp_path, registry)
+    first.manifest.set_outline(OUTLINE, first.outline_inputs())
+    run(first)
+    assert llm_calls(first) > 0
+
+    second = producer(tmp_path, registry, base_run=first.run_id)
+    run(second)
+    assert llm_calls(second) == 0
+    assert len(second.manifest.filenames) == len(first.manifest.filenames)
+    for filename, base_filename in zip(second.manifest.filenames, first.manifest.filenames):
+        assert second.manifest.reached(filename, "refined")
+        assert second.sections.markdown(filename) == first.sections.markdown(base_filename)
+
+
+def test_resume_restores_profile_and_settings(tmp_path, registry):
+    memo = producer(tmp_path, registry, context_token_budget=1500, score_threshold=6, max_refinements=3, dedup="strip")
+    resumed = main.AutoMemoProduction.resume(memo.run_id, runs_directory=str(tmp_path / "runs"), agents=registry, docx_path=None)
+    assert resumed.agent_profile == PROFILE
+    assert resumed.settings() == memo.settings()
+
+    overridden = main.AutoMemoProduction.resume(memo.run_id, runs_directory=str(tmp_path / "runs"), agents=registry, docx_path=None, dedup="off")
+    assert overridden.dedup == "off"
+    assert overridden.agent_profile == PROFILE
+    assert overridden.score_threshold == 6
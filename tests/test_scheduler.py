@@ -0,0 +1,65 @@
+# ./tests/test_scheduler.py
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.scheduler import RequestScheduler
+
+
+def wait_until_queued(scheduler, count):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with scheduler._condition:
+            if len(scheduler._waiting) >= count:
+                return
+        time.sleep(0.005)
+    raise AssertionError(f"{count} requests never queued")
+
+
+def test_throttled_endpoint_does_not_hold_back_another():
+    scheduler = RequestScheduler()
+    strong = scheduler.endpoint("strong")
+    strong.cooldown_until = time.monotonic() + 0.5
+    admitted = {}
+
+    def writer():
+        scheduler.acquire(["strong"], 100, priority=0)
+        admitted["writer"] = time.monotonic()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    wait_until_queued(scheduler, 1)
+
+    # The writer queued first and with a higher priority, but waits on the strong endpoint only
+    start = time.monotonic()
+    endpoint = scheduler.acquire(["fast"], 100, priority=1)
+    assert endpoint.name == "fast"
+    assert time.monotonic() - start < 0.2
+    assert "writer" not in admitted
+
+    thread.join(5)
+    assert admitted["writer"] >= strong.cooldown_until
+
+
+def test_requests_for_the_same_endpoint_keep_their_order():
+    scheduler = RequestScheduler()
+    strong = scheduler.endpoint("strong")
+    strong.cooldown_until = time.monotonic() + 0.3
+    order = []
+
+    def call(name, priority):
+        scheduler.acquire(["strong"], 100, priority=priority)
+        order.append(name)
+
+    first = threading.Thread(target=call, args=("first", 0))
+    first.start()
+    wait_until_queued(scheduler, 1)
+    second = threading.Thread(target=call, args=("second", 0))
+    second.start()
+    first.join(5)
+    second.join(5)
+    assert order == ["first", "second"]